@@ -0,0 +1,86 @@
+"""Database size and get_feed latency with the item contents stored inline and
+compressed.
+
+Run from the repository root: python -m benchmarks.bench_content_storage [db]
+
+Given a database it works on a copy of it, otherwise on a generated one with
+boilerplate heavy contents, some of them shared by several channels.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+from syndicate import ChannelList
+
+ITEMS = 20_000
+CHANNELS = 50
+NUMBER = 20
+
+BOILERPLATE = (
+    '<div class="post"><p>{}</p><p>Read more at <a href="https://example.com/'
+    'posts/{}">example.com</a>. Share on <a href="https://social.example/share'
+    '">social</a>.</p><footer>Copyright Example Media, all rights reserved.'
+    "</footer></div>"
+)
+
+
+def fill(feed):
+    channels = [feed.add_channel(f"channel {i}", f"url {i}") for i in range(CHANNELS)]
+    feed.add_feed_items(
+        (
+            "title",
+            # every post is syndicated by three channels
+            BOILERPLATE.format(f"Post number {i // 3}. " * 20, i // 3),
+            "link",
+            f"item-{i}",
+            i,
+            channels[i % CHANNELS],
+        )
+        for i in range(ITEMS)
+    )
+
+
+def report(feed, path, label):
+    # VACUUM gives the freed pages back and may renumber the items' rowids,
+    # which the search index is keyed by
+    feed.conn.execute("VACUUM")
+    feed.rebuild_search_index()
+    feed.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    channels = [ch_id for ch_id, _ in feed.channel_id_and_title]
+    latency = timeit.timeit(
+        lambda: [feed.get_feed(ch_id) for ch_id in channels], number=NUMBER
+    ) / (NUMBER * len(channels))
+    stats = feed.content_storage_stats()
+
+    print(f"{label}:")
+    print(f"  file size      {os.path.getsize(path) / 1024 ** 2:9.2f} MiB")
+    print(f"  get_feed       {latency * 1000:9.3f} ms")
+    print(f"  inline         {stats['inline_items']} items, {stats['inline_bytes']} bytes")
+    print(
+        f"  compressed     {stats['compressed_items']} items, {stats['contents']}"
+        f" contents, {stats['uncompressed_bytes']} -> {stats['compressed_bytes']} bytes"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "syndicate.db")
+        if len(sys.argv) > 1:
+            shutil.copyfile(sys.argv[1], path)
+
+        feed = ChannelList(path, compress_content=True)
+        feed.open()
+        if len(sys.argv) == 1:
+            feed.compress_content = False
+            fill(feed)
+
+        report(feed, path, "before")
+        feed.compress_stored_content()
+        report(feed, path, "after")
+        feed.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Compare rss.date.parse_date against plain dateutil.
+
+Run from the repository root: python -m benchmarks.bench_dates
+"""
+import timeit
+import warnings
+from dateutil import parser as dateutil_parser
+from rss.date import parse_date
+
+# Taken from real feeds
+FAST_PATH_DATES = [
+    "Sat, 07 Sep 2002 00:00:01 GMT",
+    "Tue, 10 Jun 2003 04:00:00 +0000",
+    "Wed, 02 Oct 2002 08:00:00 EST",
+    "Mon, 6 Sep 2010 16:45:00 -0700",
+    "Fri, 13 Jan 2023 10:15:32 +0100",
+    "Thu, 01 Jun 2023 12:00 GMT",
+    "2023-06-01T12:00:00Z",
+    "2023-06-01T12:00:00.123456+02:00",
+    "2023-06-01",
+]
+
+FALLBACK_DATES = [
+    "June 1, 2023 12:00 PM",
+    "Thursday, 01-Jun-23 12:00:00 UTC",
+]
+
+NUMBER = 2000
+
+
+def bench(name, func, dates):
+    seconds = timeit.timeit(lambda: [func(date) for date in dates], number=NUMBER)
+    per_date = seconds / (NUMBER * len(dates)) * 1e6
+    print(f"{name:<24}{per_date:8.2f} µs/date")
+
+
+def main():
+    # dateutil warns about the timezones it does not know every single time
+    warnings.simplefilter("ignore")
+
+    groups = (("rfc 822/iso 8601", FAST_PATH_DATES), ("other", FALLBACK_DATES))
+    for title, dates in groups:
+        print(f"{title} dates:")
+        bench("dateutil", dateutil_parser.parse, dates)
+        bench("parse_date (no cache)", parse_date.__wrapped__, dates)
+
+        parse_date.cache_clear()
+        bench("parse_date (cached)", parse_date, dates)
+
+
+if __name__ == "__main__":
+    main()
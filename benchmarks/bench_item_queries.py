@@ -0,0 +1,73 @@
+"""Latency of the item table's hot queries by row count, without and with the
+indexes added by the schema migrations.
+
+Run from the repository root: python -m benchmarks.bench_item_queries
+"""
+import os
+import tempfile
+import timeit
+from syndicate import ChannelList
+
+ROW_COUNTS = (10_000, 100_000, 300_000)
+CHANNELS = 100
+NUMBER = 20
+
+QUERIES = {
+    "get_feed": lambda feed, ch: feed.get_feed(ch),
+    "_feed_exists": lambda feed, ch: feed._feed_exists("item-1", ch),
+    "unread count": lambda feed, ch: feed.conn.execute(
+        "SELECT COUNT(*) FROM item WHERE channel = ? AND read = 0", (ch,)
+    ).fetchall(),
+    "newest 50": lambda feed, ch: feed.conn.execute(
+        "SELECT id, date FROM item WHERE channel = ? ORDER BY date DESC LIMIT 50",
+        (ch,),
+    ).fetchall(),
+}
+
+
+def fill(feed, rows):
+    channels = [feed.add_channel(f"channel {i}", f"url {i}") for i in range(CHANNELS)]
+    with feed._write() as conn:
+        conn.executemany(
+            "INSERT INTO item (id, title, content, link, date, read, channel) VALUES (?,?,?,?,?,?,?)",
+            (
+                (f"item-{i}", "title", "content", "link", i, i % 3 == 0, channels[i % CHANNELS])
+                for i in range(rows)
+            ),
+        )
+    return channels[0]
+
+
+def bench(feed, channel):
+    return {
+        name: timeit.timeit(lambda: query(feed, channel), number=NUMBER) / NUMBER
+        for name, query in QUERIES.items()
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in ROW_COUNTS:
+            feed = ChannelList(os.path.join(folder, f"{rows}.db"))
+            feed.open()
+            # as databases created before the migrations
+            feed.conn.execute("DROP INDEX item_channel_read")
+            feed.conn.execute("DROP INDEX item_channel_date")
+            channel = fill(feed, rows)
+            before = bench(feed, channel)
+
+            with feed._write() as conn:
+                feed._add_item_indexes(conn)
+            after = bench(feed, channel)
+            feed.close()
+
+            print(f"{rows} rows:")
+            for name in QUERIES:
+                print(
+                    f"  {name:<14}{before[name] * 1000:9.3f} ms ->"
+                    f"{after[name] * 1000:9.3f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
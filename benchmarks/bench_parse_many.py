@@ -0,0 +1,57 @@
+"""Throughput of rss.parser.parse_many over a synthetic corpus of feeds, by
+number of workers.
+
+Run from the repository root: python -m benchmarks.bench_parse_many
+"""
+import os
+import time
+from rss.parser import parse_many
+
+FEEDS = 500
+ITEMS_PER_FEED = 50
+
+
+def make_feed(feed):
+    items = "".join(
+        f"""
+        <item>
+            <title>Item {i} of feed {feed}</title>
+            <link>https://feed{feed}.test/{i}</link>
+            <guid>https://feed{feed}.test/{i}</guid>
+            <description>{"Lorem ipsum dolor sit amet. " * 20}</description>
+            <category>news/world</category>
+            <pubDate>Sat, 07 Sep 2002 00:{i % 60:02}:01 GMT</pubDate>
+        </item>"""
+        for i in range(ITEMS_PER_FEED)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+        <rss version="2.0">
+            <channel>
+                <title>Feed {feed}</title>
+                <link>https://feed{feed}.test</link>
+                <description>Synthetic feed</description>
+                {items}
+            </channel>
+        </rss>"""
+
+
+def main():
+    corpus = [make_feed(feed) for feed in range(FEEDS)]
+
+    baseline = None
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        parse_many(corpus, workers=workers)
+        seconds = time.perf_counter() - start
+
+        baseline = baseline or seconds
+        print(
+            f"{workers:>3} workers: {FEEDS / seconds:8.1f} feeds/s"
+            f" ({baseline / seconds:.2f}x)"
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
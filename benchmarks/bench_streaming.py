@@ -0,0 +1,86 @@
+"""Time to the first item and peak memory of fetching a large feed whole and
+then parsing it against streaming it into the parser.
+
+Run from the repository root: python -m benchmarks.bench_streaming
+"""
+import http.server
+import threading
+import time
+import tracemalloc
+from rss.parser import RssParser
+from syndicate import ChannelList, fetch_feed, stream_feed_items
+
+ITEMS = 10_000
+# bytes per second the server sends
+BANDWIDTH = 20 * 1024 * 1024
+
+ITEM = """
+    <item>
+        <title>Item {0}</title>
+        <link>http://test.test/{0}</link>
+        <description>{1}</description>
+    </item>
+"""
+
+DOCUMENT = (
+    '<rss version="2.0"><channel><title>Channel</title><link>https://test.test</link>'
+    "<description>Sample</description>{}</channel></rss>"
+).format("".join(ITEM.format(i, "content " * 100) for i in range(ITEMS)))
+DOCUMENT = DOCUMENT.encode("utf-8")
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DOCUMENT)))
+        self.end_headers()
+        piece = 64 * 1024
+        for start in range(0, len(DOCUMENT), piece):
+            self.wfile.write(DOCUMENT[start : start + piece])
+            time.sleep(piece / BANDWIDTH)
+
+    def log_message(self, *args):
+        pass
+
+
+def whole(url):
+    feed = ChannelList(":memory:")
+    feed.open()
+    yield from RssParser(fetch_feed(feed, url, timeout=30).content).iter_items()
+
+
+def streamed(url):
+    yield from stream_feed_items(url, timeout=30)
+
+
+def bench(items):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    for _ in items:
+        if first is None:
+            first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/feed"
+
+    print(f"{ITEMS} items, {len(DOCUMENT) / 1024 ** 2:.1f} MiB")
+    for name, items in (("whole", whole), ("streamed", streamed)):
+        first, total, peak = bench(items(url))
+        print(
+            f"  {name:<10} first item {first * 1000:8.1f} ms, all {total * 1000:8.1f} ms,"
+            f" peak {peak / 1024 ** 2:6.1f} MiB"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
 from ui.window import Window
 from PyQt5.QtWidgets import QApplication
-from syndicate import ChannelList
+from syndicate import ChannelList, WriteQueue
 import sys
 
 
 def main():
     feed = ChannelList()
     feed.open()
+    writes = WriteQueue(feed)
     app = QApplication(sys.argv)
-    win = Window(feed)
+    win = Window(feed, writes)
     win.show()
     code = app.exec_()
+    writes.close()
     feed.close()
     sys.exit(code)
 
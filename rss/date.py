@@ -0,0 +1,130 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from dateutil import parser as dateutil_parser
+from dateutil import tz
+
+# Almost every feed uses one of these two formats, so they are parsed with a
+# strict regex and anything else goes to dateutil's (much slower) fuzzy parser.
+
+# https://www.rfc-editor.org/rfc/rfc822#section-5, with rfc 2822's 4 digit
+# years, optional seconds and numeric zones, ex: "Sat, 07 Sep 2002 00:00:01 GMT"
+_RFC822 = re.compile(
+    r"\s*(?:[a-z]{3},?\s*)?(\d{1,2})\s+([a-z]{3})\s+(\d{4})"
+    r"\s+(\d{1,2}):(\d{2})(?::(\d{2}))?\s*([a-z]+|[+-]\d{4})?\s*",
+    re.IGNORECASE,
+)
+
+# ex: "2002-09-07T00:00:01Z", "2002-09-07 00:00:01.5+02:00" or "2002-09-07"
+_ISO8601 = re.compile(
+    r"\s*(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?"
+    r"\s*(Z|[+-]\d{2}:?\d{2})?)?\s*",
+    re.IGNORECASE,
+)
+
+_MONTHS = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+
+_UTC = tz.tzutc()
+
+# rfc 822 zones in minutes. dateutil does not know the american ones and
+# returns a naive datetime for them, we'd rather keep the offset.
+_ZONES = {
+    "ut": 0,
+    "utc": 0,
+    "gmt": 0,
+    "z": 0,
+    "est": -5 * 60,
+    "edt": -4 * 60,
+    "cst": -6 * 60,
+    "cdt": -5 * 60,
+    "mst": -7 * 60,
+    "mdt": -6 * 60,
+    "pst": -8 * 60,
+    "pdt": -7 * 60,
+}
+
+
+def _zone(value):
+    """Convert a zone name or a [+-]HH[:]MM offset into a tzinfo, None if unknown"""
+    if value is None:
+        return None
+
+    if value[0] in "+-":
+        digits = value[1:].replace(":", "")
+        minutes = int(digits[:2]) * 60 + int(digits[2:])
+        if value[0] == "-":
+            minutes = -minutes
+    elif (minutes := _ZONES.get(value.lower())) is None:
+        return None
+
+    if minutes == 0:
+        return _UTC
+
+    return tz.tzoffset(None, minutes * 60)
+
+
+def _parse_rfc822(value):
+    if not (match := _RFC822.fullmatch(value)):
+        return None
+
+    day, month, year, hour, minute, second, zone = match.groups()
+    if (month := _MONTHS.get(month.lower())) is None:
+        return None
+
+    tzinfo = _zone(zone)
+    if zone and tzinfo is None:
+        return None
+
+    return datetime(
+        int(year), month, int(day), int(hour), int(minute), int(second or 0), 0, tzinfo
+    )
+
+
+def _parse_iso8601(value):
+    if not (match := _ISO8601.fullmatch(value)):
+        return None
+
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    microsecond = int(fraction[:6].ljust(6, "0")) if fraction else 0
+
+    return datetime(
+        int(year),
+        int(month),
+        int(day),
+        int(hour or 0),
+        int(minute or 0),
+        int(second or 0),
+        microsecond,
+        _zone(zone),
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> datetime:
+    """Parse a feed date, raises ValueError if it is not a date.
+
+    Results are cached since the same timestamps tend to show up again and
+    again (every item of a feed published in a batch, the channel pubDate on
+    every poll...)."""
+    try:
+        if date := _parse_rfc822(value) or _parse_iso8601(value):
+            return date
+    except ValueError:
+        # matched the format but with values out of range, like a 31 of
+        # february. Let dateutil decide what to make of it.
+        pass
+
+    return dateutil_parser.parse(value)
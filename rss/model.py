@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import NamedTuple
+from rss.date import parse_date
 
 
 class Category(NamedTuple):
@@ -29,6 +30,38 @@ class FeedItem(NamedTuple):
     errors: list[str]  # list of errors parsing the item
 
 
+class CompactFeedItem:
+    """What the refresh path needs from an item, so a feed's items can be
+    compared against the stored ones without paying for their body.
+
+    description is a xml_parser.parser.XmlParser.LazyText (or a str when the
+    item didn't come from the compact parser), str() it to get the text.
+    pub_date may be given as the element's text, it is parsed when read."""
+
+    __slots__ = ("title", "link", "guid", "_pub_date", "description")
+
+    def __init__(self, title, link, guid, pub_date, description):
+        self.title: str = title
+        self.link: str = link
+        self.guid: tuple[str, bool] = guid
+        self._pub_date: datetime | str | None = pub_date
+        self.description = description
+
+    @property
+    def pub_date(self) -> datetime | None:
+        if isinstance(self._pub_date, str):
+            self._pub_date = parse_date(self._pub_date)
+
+        return self._pub_date
+
+    def __repr__(self):
+        return (
+            f"CompactFeedItem(title={self.title!r}, link={self.link!r}, "
+            f"guid={self.guid!r}, pub_date={self.pub_date!r}, "
+            f"description={self.description!r})"
+        )
+
+
 class Cloud(NamedTuple):
     register_procedure: str
     protocol: str
@@ -66,8 +99,8 @@ class FeedChannel(NamedTuple):
     generator: str | None
     docs: str | None
     ttl: int | None
-    skip_hours: int | None
-    skip_days: int | None
+    skip_hours: list[int] | None  # 0 to 23, GMT
+    skip_days: list[str] | None  # Monday to Sunday
     cloud: Cloud | None
     pub_date: datetime | None
     last_build_date: datetime | None
@@ -1,3 +1,4 @@
 from rss.parser.document import RssParser
+from rss.parser.bulk import RssParseError, parse_many
 
-__all__ = [RssParser]
+__all__ = [RssParser, RssParseError, parse_many]
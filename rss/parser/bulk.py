@@ -0,0 +1,41 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+from rss import model
+from rss.parser.document import RssParser
+
+
+class RssParseError(Exception):
+    """A feed that could not be parsed by parse_many.
+
+    The original exception is not sent back from the worker since it may not
+    be picklable (lxml's aren't, for instance), only its description is."""
+
+
+def _parse(content):
+    try:
+        return RssParser(content).parse()
+    except Exception as ex:
+        return RssParseError(f"{type(ex).__name__}: {ex}")
+
+
+def parse_many(
+    contents: Iterable[str], workers: int = None, chunksize: int = None
+) -> list[model.FeedChannel | RssParseError]:
+    """Parse many documents using a pool of `workers` processes (one per cpu by
+    default). Returns, in the same order as `contents`, either the parsed
+    channel or a RssParseError for the ones that failed.
+
+    Documents are sent to the workers in groups of `chunksize`, by default
+    enough for each worker to get about four of them."""
+    contents = list(contents)
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(contents) // (workers * 4))
+
+    if workers == 1 or len(contents) <= 1:
+        # not worth the cost of spawning processes
+        return [_parse(content) for content in contents]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_parse, contents, chunksize=chunksize))
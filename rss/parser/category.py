@@ -6,18 +6,24 @@ class RssCategoryParser:
     def __init__(self, root: XmlParser.XmlDocument):
         self._root = root
 
+    @staticmethod
+    def parse_element(category_element: XmlParser.XmlDocument):
+        # It has one optional attribute, domain, a string that identifies a categorization
+        # taxonomy.
+        domain = category_element.get("domain")
+
+        # The value of the element is a forward-slash-separated string that identifies a
+        # hierarchiclocation in the indicated taxonomy. Processors may establish conventions
+        # for theinterpretation of categories.
+        return [
+            model.Category(domain=domain, name=cat)
+            for cat in category_element.text.split("/")
+        ]
+
     def parse(self):
         categories = []
 
         for category_element in self._root.select("category"):
-            # It has one optional attribute, domain, a string that identifies a categorization
-            # taxonomy.
-            domain = category_element.get("domain")
-
-            # The value of the element is a forward-slash-separated string that identifies a
-            # hierarchiclocation in the indicated taxonomy. Processors may establish conventions
-            # for theinterpretation of categories.
-            for cat in category_element.text.split("/"):
-                categories.append(model.Category(domain=domain, name=cat))
+            categories.extend(self.parse_element(category_element))
 
         return categories
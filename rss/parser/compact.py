@@ -0,0 +1,133 @@
+from xml.parsers import expat
+from rss import model
+from xml_parser.parser import XmlParser
+
+
+def _tag_end(buffer, start):
+    """Index right after the '>' closing the tag that begins at `start`"""
+    quote = None
+    for index in range(start, len(buffer)):
+        char = buffer[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in b"\"'":
+            quote = char
+        elif char == ord(">"):
+            return index + 1
+
+    return len(buffer)
+
+
+class RssCompactItemParser:
+    """Scan a document's items into model.CompactFeedItem without building any
+    tree. Only the elements the refresh path needs are decoded, the description
+    is kept as the byte span it occupies in the document.
+
+    The buffer must be utf-8 encoded, expat is told to ignore the declared
+    encoding."""
+
+    # text elements that are decoded right away
+    TEXT_FIELDS = {"title", "link", "guid", "pubDate"}
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+        self._parser = expat.ParserCreate("utf-8", " ")
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._characters
+        self._parser.buffer_text = True
+
+        self._depth = 0
+        self._item_depth = None  # depth of the <item> being scanned, if any
+        self._fields = None
+        self._text = None  # chunks of the text element being read
+        self._guid_is_perma_link = True
+        self._description_start = None
+        self._done = []
+
+    def _start(self, name, attrs):
+        self._depth += 1
+
+        if self._item_depth is None:
+            if name == "item":
+                self._item_depth = self._depth
+                self._fields = {}
+            return
+
+        # only direct children of the item matter, namespaced elements have
+        # the uri before the name so they never match
+        if self._depth != self._item_depth + 1 or name in self._fields:
+            return
+
+        if name in self.TEXT_FIELDS:
+            self._text = []
+            if name == "guid":
+                possible_vals = {"false": False, "0": False, "true": True, "1": True}
+                is_perma_link = attrs.get("isPermaLink", "true")
+                self._guid_is_perma_link = possible_vals[is_perma_link]
+        elif name == "description":
+            index = self._parser.CurrentByteIndex
+            self._description_start = _tag_end(self._buffer, index)
+            # not even expat should hand us the body as str
+            self._parser.CharacterDataHandler = None
+
+    def _characters(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _end(self, name):
+        depth = self._depth
+        self._depth -= 1
+
+        if self._item_depth is None:
+            return
+
+        if depth == self._item_depth:
+            self._done.append(self._make_item())
+            self._item_depth = None
+            return
+
+        if depth != self._item_depth + 1 or name in self._fields:
+            return
+
+        if self._text is not None:
+            self._fields[name] = "".join(self._text)
+            self._text = None
+        elif self._description_start is not None:
+            end = self._parser.CurrentByteIndex
+            self._fields[name] = XmlParser.LazyText(
+                self._buffer, self._description_start, end
+            )
+            self._description_start = None
+            self._parser.CharacterDataHandler = self._characters
+
+    def _make_item(self):
+        fields = self._fields
+        link = fields.get("link", "")
+
+        guid = (link, False)  # fallback value
+        if "guid" in fields:
+            guid = (fields["guid"], self._guid_is_perma_link)
+            self._guid_is_perma_link = True
+
+        return model.CompactFeedItem(
+            title=fields.get("title", ""),
+            link=link,
+            guid=guid,
+            pub_date=fields.get("pubDate"),
+            description=fields.get("description", ""),
+        )
+
+    def __iter__(self):
+        for start in range(0, len(self._buffer), XmlParser.CHUNK_SIZE):
+            chunk = self._buffer[start : start + XmlParser.CHUNK_SIZE]
+            self._parser.Parse(chunk, False)
+            yield from self._pop_done()
+
+        self._parser.Parse(b"", True)
+        yield from self._pop_done()
+
+    def _pop_done(self):
+        done, self._done = self._done, []
+        return done
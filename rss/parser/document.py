@@ -1,17 +1,40 @@
-from dateutil import parser as dateutil_parser
-from xml_parser.parser import XmlParser
+import re
+from xml.parsers import expat
+from xml_parser.parser import Chunks, Content, XmlParser
 from rss import model
+from rss.date import parse_date
 from rss.parser.item import RssItemParser
 from rss.parser.category import RssCategoryParser
+from rss.parser.compact import RssCompactItemParser
 
 
 # https://www.rssboard.org/rss-specification, https://www.w3schools.com/xml/xml_rss.asp
 
 
+def _first_children(element: XmlParser.XmlDocument):
+    """Map each child tag name to its first element, walking the children once"""
+    children = {}
+    for tag, child in element.children():
+        children.setdefault(tag, child)
+
+    return children
+
+
+def _content(children, tag, cast_to=None):
+    if (element := children.get(tag)) is None:
+        return None
+
+    return cast_to(element.text) if cast_to else element.text
+
+
 class RssParser:
     "Naive rss parser that does the minimum validation on the rss payload that ignores namespaced elements"
 
-    def __init__(self, xml: str):
+    def __init__(self, xml: Content | Chunks):
+        """xml may be a str, the raw bytes of the document (bytes, memoryview,
+        mmap...) or a binary file. The encoding of bytes comes from their byte
+        order mark or xml declaration. iter_items() also takes an iterator of
+        the document's pieces as they are downloaded."""
         self._xml_content = xml
         self._root = None
 
@@ -23,49 +46,40 @@ class RssParser:
         # TODO: make this a property so we dont need to pass it everywhere
         channel_element = self._root.select_one("channel")
 
+        fields = {}
+        categories = []
+        item_elements = []
+        for tag, element in channel_element.children():
+            if tag == "item":
+                # A channel may contain any number of <item>s.
+                item_elements.append(element)
+            elif tag == "category":
+                categories.extend(RssCategoryParser.parse_element(element))
+            elif tag in self.CHANNEL_FIELDS:
+                field, converter = self.CHANNEL_FIELDS[tag]
+                if field not in fields:
+                    fields[field] = converter(self, element)
+
         # https://www.rssboard.org/rss-specification#requiredChannelElements
         # This element is REQUIRED and MUST contain three child elements:
         # description, link and title.
-        title = channel_element.select_one("title").text
-        link = channel_element.select_one("link").text
-        desc = channel_element.select_one("description").text
-        return model.FeedChannel(
-            title=title,
-            description=desc,
-            link=link,
-            # https://www.rssboard.org/rss-specification#optionalChannelElements
-            # The channel MAY contain each of the following OPTIONAL elements:
-            language=channel_element.select_content("language"),
-            copyright=channel_element.select_content("copyright"),
-            managing_editor=channel_element.select_content("managingEditor"),
-            webmaster=channel_element.select_content("webMaster"),
-            generator=channel_element.select_content("generator"),
-            docs=channel_element.select_content("docs"),
-            rating=channel_element.select_content("rating"),
-            ttl=channel_element.select_content("ttl", cast_to=int),
-            skip_hours=channel_element.select_content("skipHours", cast_to=int),
-            skip_days=channel_element.select_content("skipDays", cast_to=int),
-            pub_date=channel_element.select_content(
-                "pubDate", cast_to=dateutil_parser.parse
-            ),
-            last_build_date=channel_element.select_content(
-                "lastBuildDate", cast_to=dateutil_parser.parse
-            ),
-            categories=RssCategoryParser(channel_element).parse(),
-            cloud=self._parse_cloud(channel_element.select_one("cloud")),
-            image=self._parse_image(channel_element.select_one("image")),
-            text_input=self._parse_textinput(channel_element.select_one("textinput")),
-            items={},
+        for required in ("title", "link", "description"):
+            if required not in fields:
+                raise ValueError(f"Missing required channel element {required}")
+
+        # https://www.rssboard.org/rss-specification#optionalChannelElements
+        # The channel MAY contain each of the following OPTIONAL elements, the
+        # ones not present are None
+        optional = dict.fromkeys(model.FeedChannel._fields)
+        channel = model.FeedChannel(
+            **{**optional, **fields, "categories": categories, "items": {}}
         )
+        return channel, item_elements
 
     def _parse_cloud(self, cloud_element):
         # https://www.rssboard.org/rss-specification#ltcloudgtSubelementOfLtchannelgt
         # It specifies a web service that supports the rssCloud interface which can be
         # implemented in HTTP-POST, XML-RPC or SOAP 1.1.
-
-        if not cloud_element:
-            return None
-
         return model.Cloud(
             domain=cloud_element.get("domain"),
             path=cloud_element.get("path"),
@@ -76,46 +90,147 @@ class RssParser:
         )
 
     def _parse_image(self, image_element):
-        if not image_element:
-            return None
+        children = _first_children(image_element)
 
         # The image must be of type GIF, JPEG or PNG
         return model.Image(
             # Required
-            link=image_element.select_one("link").text,
-            url=image_element.select_one("url").text,
-            title=image_element.select_one("title").text,
-            description=image_element.select_content("description"),
+            link=children["link"].text,
+            url=children["url"].text,
+            title=children["title"].text,
+            description=_content(children, "description"),
             # Optional. Defines the height of the image. Default is 31. Maximum value is 400
-            height=image_element.select_content("height", cast_to=int) or 31,
+            height=_content(children, "height", cast_to=int) or 31,
             # Optional. Defines the width of the image. Default is 88. Maximum value is 144
-            width=image_element.select_content("width", cast_to=int) or 88,
+            width=_content(children, "width", cast_to=int) or 88,
         )
 
+    def _parse_skip_hours(self, skip_hours_element):
+        # https://www.rssboard.org/skip-hours-days, an <hour> for each hour
+        # (GMT) the feed should not be read in
+        return [
+            int(child.text)
+            for tag, child in skip_hours_element.children()
+            if tag == "hour"
+        ]
+
+    def _parse_skip_days(self, skip_days_element):
+        return [
+            child.text.strip()
+            for tag, child in skip_days_element.children()
+            if tag == "day"
+        ]
+
     def _parse_textinput(self, textinput_element):
-        if not textinput_element:
-            return None
+        children = _first_children(textinput_element)
 
         return model.TextInput(
-            description=textinput_element.select_one("description").text,
-            name=textinput_element.select_one("name").text,
-            link=textinput_element.select_one("link").text,
-            title=textinput_element.select_one("title").text,
+            description=children["description"].text,
+            name=children["name"].text,
+            link=children["link"].text,
+            title=children["title"].text,
         )
 
-    def _parse_items(self):
-        # A channel may contain any number of <item>s.
-        items = []
-
-        for item_element in self._root.select("channel item"):
-            items.append(RssItemParser(item_element).parse())
-
-        return items
+    # tag -> (FeedChannel field, method converting the element into its value)
+    CHANNEL_FIELDS = {
+        "title": ("title", lambda self, element: element.text),
+        "link": ("link", lambda self, element: element.text),
+        "description": ("description", lambda self, element: element.text),
+        "language": ("language", lambda self, element: element.text),
+        "copyright": ("copyright", lambda self, element: element.text),
+        "managingEditor": ("managing_editor", lambda self, element: element.text),
+        "webMaster": ("webmaster", lambda self, element: element.text),
+        "generator": ("generator", lambda self, element: element.text),
+        "docs": ("docs", lambda self, element: element.text),
+        "rating": ("rating", lambda self, element: element.text),
+        "ttl": ("ttl", lambda self, element: int(element.text)),
+        "skipHours": ("skip_hours", _parse_skip_hours),
+        "skipDays": ("skip_days", _parse_skip_days),
+        "pubDate": ("pub_date", lambda self, element: parse_date(element.text)),
+        "lastBuildDate": (
+            "last_build_date",
+            lambda self, element: parse_date(element.text),
+        ),
+        "cloud": ("cloud", _parse_cloud),
+        "image": ("image", _parse_image),
+        "textinput": ("text_input", _parse_textinput),
+    }
+
+    # the channel elements PollScheduler uses
+    POLL_HINT_TAGS = re.compile(rb"<(ttl|skipHours|skipDays)[\s>]")
+
+    def parse_poll_hints(self):
+        """The channel's ttl, skip_hours and skip_days as parse() gives them,
+        without parsing the items. Each element is only parsed up to where it
+        is, when a quick look finds it at all (most feeds have none)."""
+        buffer = XmlParser.utf8_buffer(self._xml_content)
+        hints = {"ttl": None, "skip_hours": None, "skip_days": None}
+        tags = {match[1].decode() for match in self.POLL_HINT_TAGS.finditer(buffer)}
+        for tag in tags:
+            field, converter = self.CHANNEL_FIELDS[tag]
+            for element in XmlParser.iterparse(buffer, tag):
+                hints[field] = converter(self, element)
+                break
+
+        return hints
+
+    def iter_items(self):
+        """Yield the channel's items one at a time as they are parsed.
+
+        Unlike parse() the whole document is never loaded in memory, each
+        item is freed once the next one is requested."""
+        for item_element in XmlParser.iterparse(self._xml_content, "item"):
+            yield RssItemParser(item_element).parse()
+
+    def iter_compact_items(self):
+        """Yield the channel's items as model.CompactFeedItem, whose description
+        is only decoded when read. Meant for the refresh path, where most items
+        are already known and their bodies not needed."""
+        buffer = XmlParser.utf8_buffer(self._xml_content)
+
+        yielded = 0
+        try:
+            for item in RssCompactItemParser(buffer):
+                yield item
+                yielded += 1
+        except expat.ExpatError:
+            # the scanner is strict, broken documents go to the forgiving parser
+            # starting from where it stopped
+            fallback = RssParser(str(buffer, "utf-8", "replace"))
+            for index, item in enumerate(fallback.iter_items()):
+                if index >= yielded:
+                    yield model.CompactFeedItem(
+                        title=item.title,
+                        link=item.link,
+                        guid=item.guid,
+                        pub_date=item.pub_date,
+                        description=item.description,
+                    )
+
+    def iter_new_items(self, known_guids, stop_after: int = 5, ordered: bool = True):
+        """Yield the compact items whose guid is not in known_guids, which may
+        be a set or anything else supporting `in`.
+
+        Feeds are almost always newest first, so once `stop_after` known items
+        in a row are seen the rest of the document is assumed to be known too
+        and is not even parsed. For feeds in no particular order pass
+        ordered=False to look at every item."""
+        known_run = 0
+        for item in self.iter_compact_items():
+            if item.guid[0] not in known_guids:
+                known_run = 0
+                yield item
+                continue
+
+            known_run += 1
+            if ordered and known_run >= stop_after:
+                return
 
     def parse(self):
         self._root = XmlParser.parse(self._xml_content)
-        channel = self._parse_channel()
-        for item in self._parse_items():
+        channel, item_elements = self._parse_channel()
+        for item_element in item_elements:
+            item = RssItemParser(item_element).parse()
             channel.items[item.guid[0]] = item
 
         return channel
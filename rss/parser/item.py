@@ -1,47 +1,77 @@
-from dateutil import parser as dateutil_parser
 from rss import model
+from rss.date import parse_date
 from rss.parser.category import RssCategoryParser
 from xml_parser.parser import XmlParser
 
 
-class RssItemParser:
-    def __init__(self, node: XmlParser.XmlDocument):
-        self._node = node
+def _text(element):
+    return element.text
 
-    def _parse_enclosure(self, enclosure_element):
-        # It has three required attributes. url says where the enclosure is located, length says how
-        # big it is in bytes, and type says what its type is, a standard MIME type.
-        if not enclosure_element:
-            return None
 
-        return model.Enclosure(
-            url=enclosure_element.get("url"),
-            length=int(enclosure_element.get("length")),
-            mime_type=enclosure_element.get("type"),
-        )
+def _parse_enclosure(enclosure_element):
+    # It has three required attributes. url says where the enclosure is located, length says how
+    # big it is in bytes, and type says what its type is, a standard MIME type.
+    return model.Enclosure(
+        url=enclosure_element.get("url"),
+        length=int(enclosure_element.get("length")),
+        mime_type=enclosure_element.get("type"),
+    )
 
-    def _parse_required_item_elements(self):
-        errors = []
 
-        title = ""
-        if element := self._node.select_one("title"):
-            title = element.text
-        else:
-            errors.append("Missing required element title")
+def _parse_guid(guid_element):
+    # If the guid element has an attribute named isPermaLink with a value of true,
+    # the reader may assume that it is a permalink to the item, that is, a url that
+    # can be opened in a Web browser, that points to the full item described by the
+    # <item> element.
+    possible_vals = {"false": False, "0": False, "true": True, "1": True}
+    is_perma_link = possible_vals[guid_element.get("isPermaLink", "true")]
+    return (guid_element.text, is_perma_link)
+
+
+def _parse_source(source_element):
+    # Its value is the name of the RSS channel that the item came from, derived from its
+    # <title>. It has one required attribute, url, which links to the XMLization of the
+    # source.
+    return (source_element.text, source_element.get("url", ""))
+
 
-        link = ""
-        if element := self._node.select_one("link"):
-            link = element.text
-        else:
-            errors.append("Missing required element link")
+class RssItemParser:
+    # An item MAY contain the following child elements: author, category,
+    # comments, description, enclosure, guid, link, pubDate, source and title.
+    # All of these elements are OPTIONAL.
+    # tag -> (FeedItem field, function converting the element into its value)
+    FIELDS = {
+        "title": ("title", _text),
+        "link": ("link", _text),
+        "description": ("description", _text),
+        "author": ("author", _text),
+        "comments": ("comments", _text),
+        "pubDate": ("pub_date", lambda element: parse_date(element.text)),
+        "enclosure": ("enclosure", _parse_enclosure),
+        "guid": ("guid", _parse_guid),
+        "source": ("source", _parse_source),
+    }
+
+    def __init__(self, node: XmlParser.XmlDocument):
+        self._node = node
 
-        desc = ""
-        if element := self._node.select_one("description"):
-            desc = element.text
-        else:
-            errors.append("Missing required element description")
+    def _parse_children(self):
+        """Walk the item's children once, converting the first element of each
+        known tag into its field value"""
+        fields = {}
+        categories = []
 
-        return (title, link, desc, errors)
+        for tag, element in self._node.children():
+            if tag == "category":
+                categories.extend(RssCategoryParser.parse_element(element))
+                continue
+
+            if tag in self.FIELDS:
+                field, converter = self.FIELDS[tag]
+                if field not in fields:
+                    fields[field] = converter(element)
+
+        return fields, categories
 
     def parse(self):
         # An item may represent a "story" -- much
@@ -51,44 +81,25 @@ class RssItemParser:
         # link and title may be omitted. All elements of an item are optional, however at least
         # one of title or description must be present.
         # An item MUST contain either a title or description.
-        title, link, desc, errors = self._parse_required_item_elements()
-
-        # An item MAY contain the following child elements: author, category,
-        # comments, description, enclosure, guid, link, pubDate, source and title.
-        # All of these elements are OPTIONAL.
-        enclosure = self._parse_enclosure(self._node.select_one("enclosure"))
-        categories = RssCategoryParser(self._node).parse()
-        author = self._node.select_content("author")
-        comments = self._node.select_content("comments")
-        pub_date = self._node.select_content("pubDate", cast_to=dateutil_parser.parse)
-
-        # If the guid element has an attribute named isPermaLink with a value of true,
-        # the reader may assume that it is a permalink to the item, that is, a url that
-        # can be opened in a Web browser, that points to the full item described by the
-        # <item> element. An example:
-        guid = (link, False)  # fallback value
-        if guid_element := self._node.select_one("guid"):
-            possible_vals = {"false": False, "0": False, "true": True, "1": True}
-            is_perma_link = possible_vals[guid_element.get("isPermaLink", "true")]
-            guid = (guid_element.text, is_perma_link)
-
-        # Its value is the name of the RSS channel that the item came from, derived from its
-        # <title>. It has one required attribute, url, which links to the XMLization of the
-        # source.
-        source = None
-        if source_element := self._node.select_one("source"):
-            source = (source_element.text, source_element.get("url", ""))
+        fields, categories = self._parse_children()
+
+        errors = []
+        for required in ("title", "link", "description"):
+            if required not in fields:
+                fields[required] = ""
+                errors.append(f"Missing required element {required}")
 
+        link = fields["link"]
         return model.FeedItem(
-            title=title,
+            title=fields["title"],
             link=link,
-            description=desc,
-            guid=guid,
-            enclosure=enclosure,
-            author=author,
-            source=source,
-            comments=comments,
+            description=fields["description"],
+            guid=fields.get("guid", (link, False)),  # link is the fallback value
+            enclosure=fields.get("enclosure"),
+            author=fields.get("author"),
+            source=fields.get("source"),
+            comments=fields.get("comments"),
             categories=categories,
-            pub_date=pub_date,
+            pub_date=fields.get("pub_date"),
             errors=errors,
         )
@@ -0,0 +1,34 @@
+from rss.parser import RssParseError, RssParser, parse_many
+from rss.parser.tests.test_base import RssParserBaseTest
+
+
+def feed(title):
+    return f"""
+        <rss version="2.0">
+            <channel>
+                <title>{title}</title>
+                <link>https://test.test</link>
+                <description>Sample description</description>
+                <item>
+                    <title>Item Title</title>
+                    <link>http://test.test</link>
+                    <pubDate>Sat, 07 Sep 2002 00:00:01 GMT</pubDate>
+                </item>
+            </channel>
+        </rss>
+    """
+
+
+class ParseManyTest(RssParserBaseTest):
+    def test_parse_many_keeps_input_order(self):
+        contents = [feed(f"Channel {i}") for i in range(5)]
+        contents.insert(2, "<rss><channel></channel></rss>")
+
+        given = parse_many(contents, workers=2, chunksize=2)
+
+        self.assertEqual(len(given), 6)
+        self.assertIsInstance(given[2], RssParseError)
+        del given[2], contents[2]
+
+        for channel, content in zip(given, contents):
+            self.assertNamedtupleEqual(channel, RssParser(content).parse())
@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from rss.date import parse_date
+
+
+class ParseDateTest(unittest.TestCase):
+    def test_parse_rfc822(self):
+        self.assertEqual(
+            parse_date("Sat, 07 Sep 2002 00:00:01 GMT"),
+            datetime(2002, 9, 7, 0, 0, 1, tzinfo=timezone.utc),
+        )
+        self.assertEqual(
+            parse_date("7 sep 2002 10:30 -0330"),
+            datetime(2002, 9, 7, 10, 30, tzinfo=timezone(-timedelta(hours=3.5))),
+        )
+        self.assertEqual(
+            parse_date("Sat, 07 Sep 2002 00:00:01 EST"),
+            datetime(2002, 9, 7, 0, 0, 1, tzinfo=timezone(-timedelta(hours=5))),
+        )
+
+    def test_parse_iso8601(self):
+        self.assertEqual(
+            parse_date("2002-09-07T00:00:01.25+02:00"),
+            datetime(2002, 9, 7, 0, 0, 1, 250000, timezone(timedelta(hours=2))),
+        )
+        self.assertEqual(parse_date("2002-09-07"), datetime(2002, 9, 7))
+
+    def test_parse_other_formats_with_dateutil(self):
+        self.assertEqual(parse_date("September 7, 2002"), datetime(2002, 9, 7))
+
+    def test_parse_invalid_date(self):
+        with self.assertRaises(ValueError):
+            parse_date("30 Feb 2002 00:00:00 GMT")
+
+        with self.assertRaises(ValueError):
+            parse_date("not a date")
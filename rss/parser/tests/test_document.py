@@ -1,3 +1,5 @@
+import mmap
+import tempfile
 from rss import model
 from rss.parser import RssParser
 from rss.parser.tests.test_base import RssParserBaseTest
@@ -110,6 +112,42 @@ class RssParserTest(RssParserBaseTest):
         self.assertEqual(given.text_input.link, "https://test.test/foo")
         self.assertEqual(given.text_input.description, "Search Google")
 
+    def test_parsing_channel_polling_hints(self):
+        content = """
+        <rss version="2.0">
+            <channel>
+                <title>Channel Title</title>
+                <link>https://test.test</link>
+                <description>Sample description</description>
+                <ttl>60</ttl>
+                <skipHours>
+                    <hour>0</hour>
+                    <hour>23</hour>
+                </skipHours>
+                <skipDays>
+                    <day>Saturday</day>
+                    <day> Sunday </day>
+                </skipDays>
+            </channel>
+        </rss>
+        """
+        given = RssParser(content).parse()
+
+        self.assertEqual(given.ttl, 60)
+        self.assertEqual(given.skip_hours, [0, 23])
+        self.assertEqual(given.skip_days, ["Saturday", "Sunday"])
+
+        # without parsing the rest
+        hints = RssParser(content.encode("utf-8")).parse_poll_hints()
+        self.assertEqual(hints["ttl"], 60)
+        self.assertEqual(hints["skip_hours"], [0, 23])
+        self.assertEqual(hints["skip_days"], ["Saturday", "Sunday"])
+        hints = RssParser("<rss><channel><title>t</title></channel></rss>")
+        self.assertEqual(
+            hints.parse_poll_hints(),
+            {"ttl": None, "skip_hours": None, "skip_days": None},
+        )
+
     def test_parse_channel_items(self):
         given = RssParser(
             """
@@ -171,3 +209,200 @@ class RssParserTest(RssParserBaseTest):
 
         self.assertEqual(len(given.items), 2)
         self.assertNamedtupleEqual(given, expected)
+
+    def test_iter_items_yields_the_same_items_as_parse(self):
+        content = """
+            <rss xmlns:atom="http://www.w3.org/2005/Atom" version="2.0">
+                <channel>
+                    <title>Channel Title</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    <item>
+                        <title>Item Title</title>
+                        <atom:link href="http://test.t/feed/" rel="self"/>
+                        <link>http://test.test</link>
+                        <guid isPermaLink="false">0000</guid>
+                        <description><![CDATA[<p>description</p>]]></description>
+                        <category domain="http://test.test">a/b</category>
+                        <enclosure url="http://test.test/a.mp3" length="10" type="audio/mpeg"/>
+                        <pubDate>Sat, 07 Sep 2002 00:00:01 GMT</pubDate>
+                    </item>
+                    <item>
+                        <title>Item2Title</title>
+                        <link>http://test.two</link>
+                        <description>description of item 2</description>
+                    </item>
+                </channel>
+            </rss>
+        """
+
+        given = list(RssParser(content).iter_items())
+        expected = list(RssParser(content).parse().items.values())
+
+        self.assertEqual(len(given), 2)
+        for given_item, expected_item in zip(given, expected):
+            self.assertNamedtupleEqual(given_item, expected_item)
+
+    def test_iter_items_yields_items_parsed_before_a_truncated_end(self):
+        given = RssParser(
+            """
+            <rss version="2.0">
+                <channel>
+                    <title>Channel Title</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    <item>
+                        <title>Item Title</title>
+                        <link>http://test.test</link>
+                        <description>description</description>
+                    </item>
+                    <item>
+                        <title>Item2
+        """
+        ).iter_items()
+
+        self.assertEqual(next(given).title, "Item Title")
+
+    def test_channel_fields_come_from_its_own_children(self):
+        given = RssParser(
+            """
+            <rss version="2.0">
+                <channel>
+                    <image>
+                        <url>https://www.test.test/images/logo.gif</url>
+                        <title>Image title</title>
+                        <link>https://www.test.test/</link>
+                    </image>
+                    <title>Channel Title</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    <category>channel</category>
+                    <item>
+                        <title>Item Title</title>
+                        <category>item</category>
+                    </item>
+                </channel>
+            </rss>
+        """
+        ).parse()
+
+        self.assertEqual(given.title, "Channel Title")
+        self.assertEqual(given.categories, [model.Category(domain=None, name="channel")])
+
+    def test_iter_compact_items_matches_parse(self):
+        content = """
+            <rss xmlns:atom="http://www.w3.org/2005/Atom" version="2.0">
+                <channel>
+                    <title>Channel Title</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    <item>
+                        <title>Item &amp; Title</title>
+                        <atom:link href="http://test.t/feed/" rel="self"/>
+                        <link>http://test.test</link>
+                        <guid isPermaLink="false">0000</guid>
+                        <description data-x="a>b"><![CDATA[<p>desc</p>]]> &lt;b&gt;</description>
+                        <pubDate>Sat, 07 Sep 2002 00:00:01 GMT</pubDate>
+                    </item>
+                    <item>
+                        <title>Item2Title</title>
+                        <link>http://test.two</link>
+                    </item>
+                </channel>
+            </rss>
+        """
+
+        given = list(RssParser(content).iter_compact_items())
+        expected = list(RssParser(content).parse().items.values())
+
+        self.assertEqual(len(given), 2)
+        for given_item, expected_item in zip(given, expected):
+            self.assertEqual(given_item.title, expected_item.title)
+            self.assertEqual(given_item.link, expected_item.link)
+            self.assertEqual(given_item.guid, expected_item.guid)
+            self.assertEqual(given_item.pub_date, expected_item.pub_date)
+            self.assertEqual(str(given_item.description), expected_item.description)
+
+    def test_iter_compact_items_decodes_description_on_demand(self):
+        given = next(
+            RssParser(
+                """
+                <rss version="2.0">
+                    <channel>
+                        <item>
+                            <title>Item Title</title>
+                            <description>caf&#233;</description>
+                        </item>
+                    </channel>
+                </rss>
+            """
+            ).iter_compact_items()
+        )
+
+        self.assertIn("LazyText", repr(given.description))
+        self.assertEqual(str(given.description), "café")
+
+    def test_parse_bytes_file_and_mmap_in_their_declared_encoding(self):
+        content = """<?xml version="1.0" encoding="ISO-8859-1"?>
+            <rss version="2.0">
+                <channel>
+                    <title>Café</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    <item>
+                        <title>Item Título</title>
+                        <link>http://test.test</link>
+                        <description>Descrição</description>
+                    </item>
+                </channel>
+            </rss>
+        """
+        expected = RssParser(content).parse()
+        raw = content.encode("latin-1")
+
+        with tempfile.TemporaryFile() as file:
+            file.write(raw)
+            file.flush()
+
+            inputs = {
+                "bytes": lambda: raw,
+                "utf-16": lambda: content.replace("ISO-8859-1", "UTF-16").encode(
+                    "utf-16"
+                ),
+                "file": lambda: file.seek(0) or file,
+                "mmap": lambda: mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ),
+            }
+            for name, make_input in inputs.items():
+                with self.subTest(input=name):
+                    self.assertNamedtupleEqual(
+                        RssParser(make_input()).parse(), expected
+                    )
+
+                    items = list(RssParser(make_input()).iter_items())
+                    self.assertEqual(items, list(expected.items.values()))
+
+                    items = list(RssParser(make_input()).iter_compact_items())
+                    self.assertEqual(items[0].title, "Item Título")
+                    self.assertEqual(str(items[0].description), "Descrição")
+
+    def test_iter_new_items_stops_after_a_run_of_known_items(self):
+        item = "<item><title>{0}</title><guid>{0}</guid></item>"
+        content = f"""
+            <rss version="2.0">
+                <channel>
+                    {item.format("new")}
+                    {item.format("known1")}
+                    {item.format("new2")}
+                    {item.format("known2")}
+                    {item.format("known3")}
+                    {item.format("late")}
+                </channel>
+            </rss>
+        """
+        known = {"known1", "known2", "known3"}
+
+        given = RssParser(content).iter_new_items(known, stop_after=2)
+        self.assertEqual([item.title for item in given], ["new", "new2"])
+
+        given = RssParser(content).iter_new_items(known, stop_after=2, ordered=False)
+        self.assertEqual([item.title for item in given], ["new", "new2", "late"])
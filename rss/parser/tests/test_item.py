@@ -7,7 +7,7 @@ from xml_parser.parser import XmlParser
 
 class RssParserItemTest(RssParserBaseTest):
     def parse_item(self, content):
-        return RssItemParser(XmlParser.parse(content)).parse()
+        return RssItemParser(XmlParser.parse(content).select_one("item")).parse()
 
     def test_can_parse_channel_item_with_only_required_elements(self):
         given = self.parse_item(
@@ -1,16 +1,23 @@
 import datetime
-import urllib.request as req
+import urllib.parse
 from pathlib import Path
+import contextlib
+import concurrent.futures
+import queue
+import signal
 import sqlite3
-import certifi
-import copy
-import json
+import sys
+import threading
+import time
 import uuid
-import re
-import dateutil
-import requests
+import hashlib
+import heapq
+import random
+import zlib
 
 from rss.parser import RssParser
+from rss.date import parse_date
+from xml_parser.parser import XmlParser
 
 def uuid_from_url(url):
     return str(uuid.uuid3(uuid.NAMESPACE_URL, url))
@@ -20,6 +27,139 @@ class FeedError(Exception):
     pass
 
 
+class ParseCache:
+    """Remembers a hash of the last document parsed for each channel so a poll
+    returning the very same payload can skip parsing entirely. The hashes are
+    stored with the channels of the ChannelList, so they outlive the process."""
+
+    def __init__(self, feed):
+        self.feed = feed
+        # parse_rss runs on many threads at once, see Refresher
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # size of the documents that were not parsed thanks to the cache
+        self.skipped_bytes = 0
+
+    @staticmethod
+    def digest(content):
+        """Hash and size of the raw document. Files are rewound after being
+        read so they must be seekable."""
+        position = None
+        if XmlParser.is_file(content):
+            position = content.tell()
+
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        for chunk in XmlParser.read_chunks(content):
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            digest.update(chunk)
+            size += len(chunk)
+
+        if position is not None:
+            content.seek(position)
+
+        return digest.digest(), size
+
+    def is_unchanged(self, channel_id, digest, size):
+        """Whether the document of that digest is the last one stored for the
+        channel, counting it as a hit or miss"""
+        unchanged = self.feed.document_digest(channel_id) == digest
+        with self._lock:
+            if unchanged:
+                self.hits += 1
+                self.skipped_bytes += size
+            else:
+                self.misses += 1
+        return unchanged
+
+    def store(self, channel_id, digest):
+        self.feed.set_document_digest(channel_id, digest)
+
+    def forget(self, channel_id):
+        self.feed.set_document_digest(channel_id, None)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_bytes": self.skipped_bytes,
+            }
+
+
+class RetentionPolicy:
+    """Which items of a channel are kept: at most its `max_items` newest ones
+    and none older than `max_age` seconds (None for no limit), always
+    keeping the unread and starred ones if asked to. Items without a pubDate
+    are as old as the time they were first stored."""
+
+    def __init__(
+        self, max_items=None, max_age=None, keep_unread=True, keep_starred=True
+    ):
+        self.max_items = max_items
+        self.max_age = max_age
+        self.keep_unread = keep_unread
+        self.keep_starred = keep_starred
+
+    def __repr__(self):
+        return (
+            f"RetentionPolicy(max_items={self.max_items}, max_age={self.max_age}, "
+            f"keep_unread={self.keep_unread}, keep_starred={self.keep_starred})"
+        )
+
+
+def _inflate(data):
+    """The text of a compressed item content, sql's inflate()"""
+    if data is None:
+        return None
+    return zlib.decompress(data).decode("utf-8")
+
+
+class FeedResponse:
+    """A feed's document as fetched by fetch_feed, with the validators to
+    send on the next request. A 304 has no content, the document didn't
+    change since the one of the validators sent."""
+
+    def __init__(
+        self,
+        url,
+        content,
+        status=200,
+        etag=None,
+        last_modified=None,
+        content_length=None,
+    ):
+        self.url = url
+        self.content = content
+        self.status = status
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_length = content_length
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+    def __repr__(self):
+        return f"<FeedResponse {self.status} {self.url}>"
+
+
+class KnownItemIds:
+    """The ids of the items stored for a channel, as a container. Each `in` is
+    one indexed query so checking a feed's newest items against it doesn't
+    load the whole channel."""
+
+    def __init__(self, feed, channel_id):
+        self._feed = feed
+        self._channel_id = channel_id
+
+    def __contains__(self, item_id):
+        return self._feed._feed_exists(item_id, self._channel_id)
+
+
 """
 	channels.json format:
 {
@@ -42,33 +182,165 @@ DB_FOLDER.mkdir(exist_ok=True)
 
 # FIXME: folder need to be created
 class ChannelList:
-    def __init__(self, db_file_name=DB_FILE):
+    """The channels and their items, stored in a sqlite database.
+
+    It may be used from many threads: writes go through a single connection,
+    one at a time, while reads get a connection of their own from a small pool
+    of read only ones. The database is in WAL mode so reads see the last
+    committed state and never wait for a write to finish.
+
+    With `compress_content` the item contents are stored compressed in a table
+    of their own, keyed by their hash so a body syndicated by several
+    channels is stored once. The ones stored either way are read the same."""
+
+    def __init__(self, db_file_name=DB_FILE, readers=4, compress_content=False):
         self.db_file = db_file_name
-        self.conn = sqlite3.connect(self.db_file)
-        self.cursor = self.conn.cursor()
+        self.conn = sqlite3.connect(
+            self.db_file, isolation_level=None, check_same_thread=False
+        )
+        self._add_functions(self.conn)
         self.channel_table_name = "channel"
         self.item_table_name = "item"
+        self.version_table_name = "schema_version"
+        self.search_table_name = "item_search"
+        self.content_table_name = "item_content"
+        self.text_view_name = "item_text"
+        self.pruned_table_name = "pruned_item"
+        self.stats_table_name = "channel_stats"
+        self.compress_content = compress_content
+        self.retention_table_name = "retention_policy"
         self._callback = None
+        self.parse_cache = ParseCache(self)
+
+        self._write_lock = threading.RLock()
+        self._write_depth = 0  # how many _write() are nested in the current one
+        self._write_owner = None  # thread running the current write
+        # new items to notify once the write adding them is committed
+        self._pending_items = []
+
+        # an in-memory database only exists for its connection, so readers
+        # have to share the writer's
+        self._in_memory = str(self.db_file) == ":memory:"
+        self._max_readers = readers
+        self._readers = queue.Queue()
+        self._reader_count = 0
+        self._reader_count_lock = threading.Lock()
+
+    @staticmethod
+    def _add_functions(conn):
+        # every connection needs it, the search triggers call it too
+        conn.create_function("inflate", 1, _inflate, deterministic=True)
+
+    def _connect_reader(self):
+        uri = Path(self.db_file).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(
+            uri, uri=True, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA busy_timeout = 5000")
+        self._add_functions(conn)
+        return conn
+
+    @contextlib.contextmanager
+    def _read(self):
+        """A connection to run queries on. It is the writer's when called from
+        within a _write(), so the changes not committed yet are seen."""
+        if self._in_memory or self._write_owner == threading.get_ident():
+            with self._write_lock:
+                yield self.conn
+            return
+
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_count_lock:
+                create = self._reader_count < self._max_readers
+                if create:
+                    self._reader_count += 1
+
+            conn = self._connect_reader() if create else self._readers.get()
+
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextlib.contextmanager
+    def _write(self):
+        """The writer connection inside a transaction, committed when the
+        outermost _write() exits and rolled back if it raises. Nested ones
+        are savepoints, so they can fail without undoing the others."""
+        committed = []
+        with self._write_lock:
+            depth = self._write_depth
+            pending = len(self._pending_items)
+            savepoint = f"write_{depth}"
+            self.conn.execute(f"SAVEPOINT {savepoint}" if depth else "BEGIN IMMEDIATE")
+            self._write_depth += 1
+            self._write_owner = threading.get_ident()
+
+            try:
+                yield self.conn
+            except BaseException:
+                if depth:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self.conn.execute("ROLLBACK")
+                del self._pending_items[pending:]
+                raise
+            else:
+                self.conn.execute(f"RELEASE {savepoint}" if depth else "COMMIT")
+                if not depth:
+                    committed, self._pending_items = self._pending_items, []
+            finally:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._write_owner = None
+
+        # out of the lock, the callback may write too
+        self._notify(committed)
+
+    def _notify(self, items):
+        """Call the subscribed callback with the new items, once the write
+        adding them is committed"""
+        if self._write_owner == threading.get_ident():
+            self._pending_items.extend(items)
+        elif self._callback is not None:
+            for item in items:
+                self._callback(item)
 
     @property
     def channel_links(self):
-        self.cursor.execute(f"SELECT link from {self.channel_table_name}")
-        rows = self.cursor.fetchall()
-        rows = [row[0] for row in rows]
+        with self._read() as conn:
+            rows = conn.execute(f"SELECT link from {self.channel_table_name}")
+            rows = [row[0] for row in rows.fetchall()]
         return rows
 
     @property
     def channel_id_and_title(self):
-        self.cursor.execute(f"SELECT id, name from {self.channel_table_name}")
-        rows = self.cursor.fetchall()
-        rows = [(row[0], row[1]) for row in rows]
+        with self._read() as conn:
+            rows = conn.execute(f"SELECT id, name from {self.channel_table_name}")
+            rows = [(row[0], row[1]) for row in rows.fetchall()]
         return rows
 
-    def get_feed(self, channel_id):
-        self.cursor.execute(
-            f"SELECT * FROM {self.item_table_name} WHERE channel = ?", (channel_id,)
+    def _content_sql(self, row):
+        """The content of the `row` item (a table name or alias), whether it is
+        stored inline or compressed"""
+        return (
+            f"COALESCE(inflate((SELECT data FROM {self.content_table_name}"
+            f" WHERE hash = {row}.content_hash)), {row}.content)"
         )
-        rows = self.cursor.fetchall()
+
+    def get_feed(self, channel_id):
+        with self._read() as conn:
+            rows = conn.execute(
+                f"""
+				SELECT id, title, {self._content_sql(self.item_table_name)},
+					link, date, read, starred
+				FROM {self.item_table_name} WHERE channel = ?
+			""",
+                (channel_id,),
+            ).fetchall()
 
         feed = {}
         for row in rows:
@@ -79,28 +351,155 @@ class ChannelList:
                 "id": id,
                 "date": row[4],
                 "read": bool(row[5]),
+                "starred": bool(row[6]),
                 "content": row[2],
                 "channel": channel_id,
             }
 
         return feed
 
+    ITEM_COLUMNS = (
+        "id",
+        "title",
+        "content",
+        "link",
+        "date",
+        "read",
+        "starred",
+        "channel",
+    )
+
+    def get_feed_page(
+        self,
+        channel_id,
+        limit=50,
+        after=None,
+        before=None,
+        columns=ITEM_COLUMNS,
+        unread_only=False,
+        since=None,
+        until=None,
+    ):
+        """Up to `limit` items of the channel, newest first, as a list of dicts
+        with only the given `columns` (id and date are always there).
+
+        Pages are keyed by the (date, id) of their rows: pass the last row's as
+        `after` to get the next (older) page or the first row's as `before` to
+        get the previous (newer) one. Unlike an offset this costs the same no
+        matter how deep the page is. `since` (inclusive) and `until`
+        (exclusive) limit the item dates."""
+        if unknown := set(columns) - set(self.ITEM_COLUMNS):
+            raise ValueError(f"Unknown item columns: {', '.join(sorted(unknown))}")
+
+        columns = ["id", "date"] + [c for c in columns if c not in ("id", "date")]
+        where = ["channel = ?"]
+        params = [channel_id]
+
+        if unread_only:
+            where.append("read = 0")
+        if since is not None:
+            where.append("date >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("date < ?")
+            params.append(until)
+
+        # a previous page is read from the key up and reversed afterwards
+        order = "DESC"
+        if after is not None:
+            where.append("(date, id) < (?, ?)")
+            params.extend(after)
+        elif before is not None:
+            where.append("(date, id) > (?, ?)")
+            params.extend(before)
+            order = "ASC"
+
+        selected = [
+            f"{self._content_sql(self.item_table_name)} AS content"
+            if column == "content"
+            else column
+            for column in columns
+        ]
+        with self._read() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(selected)} FROM {self.item_table_name}"
+                f" WHERE {' AND '.join(where)}"
+                f" ORDER BY date {order}, id {order} LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+
+        if order == "ASC":
+            rows.reverse()
+
+        page = [dict(zip(columns, row)) for row in rows]
+        for column in ("read", "starred"):
+            if column in columns:
+                for item in page:
+                    item[column] = bool(item[column])
+
+        return page
+
+    def get_item_content(self, channel_id, item_id):
+        """The content of one item, left out of the pages of a long list until
+        it is shown. None if there is no such item."""
+        with self._read() as conn:
+            row = conn.execute(
+                f"SELECT {self._content_sql(self.item_table_name)} FROM {self.item_table_name} WHERE channel=? AND id=?",
+                (channel_id, item_id),
+            ).fetchone()
+        return row[0] if row else None
+
     def open(self):
+        # only takes effect on a new database, before anything is written to
+        # it (even the journal mode), see enable_incremental_vacuum()
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if not self._in_memory:
+            # readers don't block the writer and the other way around.
+            # synchronous=NORMAL is still safe from corruption in WAL mode.
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA busy_timeout = 5000")
+
         self._create_db()
+        self._migrate()
+
+    @property
+    def incremental_vacuum_enabled(self):
+        # the writer's, a reader may not see the header changed by a VACUUM
+        with self._write_lock:
+            return self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def enable_incremental_vacuum(self):
+        """Rebuild a database created before incremental vacuum existed, so
+        incremental_vacuum() gives the pruned space back. It is a full VACUUM,
+        which blocks every write and needs about twice the database's size
+        on disk meanwhile, so it is only done when asked for (`python -m
+        syndicate vacuum`). Returns whether it had to be done."""
+        if self.incremental_vacuum_enabled:
+            return False
+
+        # it can't be done in a transaction, so not by a migration
+        with self._write_lock:
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.conn.execute("VACUUM")
+        # it may have renumbered the items the index is keyed by
+        self.rebuild_search_index()
+        return True
 
     def _create_db(self):
-        self.cursor.execute(
-            f"""
+        with self._write() as conn:
+            conn.execute(
+                f"""
 			CREATE TABLE IF NOT EXISTS {self.channel_table_name} (
 				id 		VARCHAR(36) NOT NULL PRIMARY KEY,
 				name	VARCHAR(30) NOT NULL,
 				link  	VARCHAR(120)
 			);
 		"""
-        )
+            )
 
-        self.cursor.execute(
-            f"""
+            conn.execute(
+                f"""
 			CREATE TABLE IF NOT EXISTS {self.item_table_name} (
 				id 		VARCHAR(36) NOT NULL PRIMARY KEY,
 				title 	VARCHAR(160) NOT NULL,
@@ -112,90 +511,1187 @@ class ChannelList:
 				FOREIGN KEY(channel) REFERENCES {self.channel_table_name}(id)
 			);
 		"""
+            )
+
+    def _add_item_indexes(self, conn):
+        # lookups by channel alone (get_feed) use either index's prefix, the
+        # date one ends with the id so the date ordered views are covered
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS item_channel_read ON {self.item_table_name} (channel, read)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS item_channel_date ON {self.item_table_name} (channel, date, id)"
+        )
+
+    def _add_item_search(self, conn):
+        # An external content table, the text is only stored in item and the
+        # triggers keep the index in sync with it. NOTE: it is keyed by item's
+        # implicit rowid, which a full VACUUM may renumber, so the index must
+        # be rebuilt after one.
+        conn.execute(
+            f"""
+			CREATE VIRTUAL TABLE IF NOT EXISTS {self.search_table_name} USING fts5(
+				title,
+				content,
+				content='{self.item_table_name}',
+				content_rowid='rowid',
+				tokenize='unicode61 remove_diacritics 2'
+			);
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.search_table_name}_insert
+			AFTER INSERT ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} (rowid, title, content)
+				VALUES (new.rowid, new.title, new.content);
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.search_table_name}_delete
+			AFTER DELETE ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} ({self.search_table_name}, rowid, title, content)
+				VALUES ('delete', old.rowid, old.title, old.content);
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.search_table_name}_update
+			AFTER UPDATE OF title, content ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} ({self.search_table_name}, rowid, title, content)
+				VALUES ('delete', old.rowid, old.title, old.content);
+				INSERT INTO {self.search_table_name} (rowid, title, content)
+				VALUES (new.rowid, new.title, new.content);
+			END;
+		"""
+        )
+        # the items stored before this version
+        self._rebuild_search_index(conn)
+
+    def _add_item_content(self, conn):
+        # Compressed contents, by hash. An item's content_hash points to its
+        # content here, otherwise (NULL) the content is inline as before.
+        conn.execute(
+            f"""
+			CREATE TABLE IF NOT EXISTS {self.content_table_name} (
+				hash	BLOB NOT NULL PRIMARY KEY,
+				data	BLOB NOT NULL,
+				size	INTEGER NOT NULL
+			);
+		"""
+        )
+        conn.execute(
+            f"ALTER TABLE {self.item_table_name} ADD COLUMN content_hash BLOB"
+        )
+        # to find out whether a content is still used by some item
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS item_content_hash ON {self.item_table_name} (content_hash) WHERE content_hash IS NOT NULL"
+        )
+
+        # The search index reads the item text from a view now, so snippets
+        # and rebuilds see the compressed contents too.
+        conn.execute(
+            f"""
+			CREATE VIEW IF NOT EXISTS {self.text_view_name} AS
+			SELECT rowid, title, {self._content_sql(self.item_table_name)} AS content
+			FROM {self.item_table_name};
+		"""
+        )
+        for trigger in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {self.search_table_name}_{trigger}")
+        conn.execute(f"DROP TABLE IF EXISTS {self.search_table_name}")
+
+        conn.execute(
+            f"""
+			CREATE VIRTUAL TABLE {self.search_table_name} USING fts5(
+				title,
+				content,
+				content='{self.text_view_name}',
+				content_rowid='rowid',
+				tokenize='unicode61 remove_diacritics 2'
+			);
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER {self.search_table_name}_insert
+			AFTER INSERT ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} (rowid, title, content)
+				VALUES (new.rowid, new.title, {self._content_sql("new")});
+			END;
+		"""
+        )
+        # NOTE: the content of a deleted item must still be there when this
+        # runs, so unused contents are only deleted afterwards
+        conn.execute(
+            f"""
+			CREATE TRIGGER {self.search_table_name}_delete
+			AFTER DELETE ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} ({self.search_table_name}, rowid, title, content)
+				VALUES ('delete', old.rowid, old.title, {self._content_sql("old")});
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER {self.search_table_name}_update
+			AFTER UPDATE OF title, content, content_hash ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} ({self.search_table_name}, rowid, title, content)
+				VALUES ('delete', old.rowid, old.title, {self._content_sql("old")});
+				INSERT INTO {self.search_table_name} (rowid, title, content)
+				VALUES (new.rowid, new.title, {self._content_sql("new")});
+			END;
+		"""
+        )
+        self._rebuild_search_index(conn)
+
+    def _add_item_retention(self, conn):
+        conn.execute(
+            f"ALTER TABLE {self.item_table_name} ADD COLUMN starred INTEGER DEFAULT FALSE"
+        )
+        # The ids of the pruned items, so they are not stored again while the
+        # channel's document still lists them
+        conn.execute(
+            f"""
+			CREATE TABLE IF NOT EXISTS {self.pruned_table_name} (
+				id 		VARCHAR(36) NOT NULL PRIMARY KEY,
+				channel	VARCHAR(36) NOT NULL,
+				date	DATE NOT NULL
+			);
+		"""
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS pruned_item_channel_date ON {self.pruned_table_name} (channel, date)"
+        )
+
+    def _add_channel_stats(self, conn):
+        # Counters of each channel's items, kept up to date by the triggers
+        # below so they are read without going through its items
+        conn.execute(
+            f"""
+			CREATE TABLE IF NOT EXISTS {self.stats_table_name} (
+				channel	VARCHAR(36) NOT NULL PRIMARY KEY,
+				total	INTEGER NOT NULL DEFAULT 0,
+				unread	INTEGER NOT NULL DEFAULT 0,
+				newest	DATE
+			);
+		"""
+        )
+        # NOTE: newest only has to be looked up again (in item_channel_date)
+        # when the newest item is the one leaving the channel
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.stats_table_name}_insert
+			AFTER INSERT ON {self.item_table_name} BEGIN
+				INSERT INTO {self.stats_table_name} (channel, total, unread, newest)
+				VALUES (new.channel, 1, new.read = 0, new.date)
+				ON CONFLICT (channel) DO UPDATE SET
+					total = total + 1,
+					unread = unread + excluded.unread,
+					newest = MAX(COALESCE(newest, excluded.newest), excluded.newest);
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.stats_table_name}_delete
+			AFTER DELETE ON {self.item_table_name} BEGIN
+				UPDATE {self.stats_table_name} SET
+					total = total - 1,
+					unread = unread - (old.read = 0),
+					newest = CASE WHEN old.date < newest THEN newest ELSE (
+						SELECT MAX(date) FROM {self.item_table_name} WHERE channel = old.channel
+					) END
+				WHERE channel = old.channel;
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.stats_table_name}_update_read
+			AFTER UPDATE OF read ON {self.item_table_name}
+			WHEN old.read != new.read AND old.channel = new.channel BEGIN
+				UPDATE {self.stats_table_name} SET unread = unread + (new.read = 0) - (old.read = 0)
+				WHERE channel = new.channel;
+			END;
+		"""
+        )
+        # nothing changes an item's date or channel, but just in case
+        conn.execute(
+            f"""
+			CREATE TRIGGER IF NOT EXISTS {self.stats_table_name}_update_channel
+			AFTER UPDATE OF date, channel ON {self.item_table_name}
+			WHEN old.date != new.date OR old.channel != new.channel BEGIN
+				DELETE FROM {self.stats_table_name} WHERE channel IN (old.channel, new.channel);
+				INSERT INTO {self.stats_table_name} (channel, total, unread, newest)
+				SELECT channel, COUNT(*), SUM(read = 0), MAX(date)
+				FROM {self.item_table_name} WHERE channel IN (old.channel, new.channel)
+				GROUP BY channel;
+			END;
+		"""
+        )
+        self._rebuild_channel_stats(conn)
+
+    def _add_channel_http_validators(self, conn):
+        # from the last response with the channel's document, see fetch_feed
+        for column in (
+            "etag VARCHAR(200)",
+            "last_modified VARCHAR(40)",
+            "content_length INTEGER",
+        ):
+            conn.execute(f"ALTER TABLE {self.channel_table_name} ADD COLUMN {column}")
+
+    def _add_channel_poll_hints(self, conn):
+        # the channel's ttl, skipHours and skipDays, see PollScheduler
+        for column in (
+            "ttl INTEGER",
+            "skip_hours VARCHAR(70)",
+            "skip_days VARCHAR(70)",
+        ):
+            conn.execute(f"ALTER TABLE {self.channel_table_name} ADD COLUMN {column}")
+
+    def _add_plain_search_triggers(self, conn):
+        # The triggers of _add_item_content call inflate(), which only exists
+        # in this module's connections, so nothing else could write to item.
+        # Now they only index the inline contents and _index_compressed()
+        # keeps the compressed ones in sync.
+        for trigger in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {self.search_table_name}_{trigger}")
+
+        conn.execute(
+            f"""
+			CREATE TRIGGER {self.search_table_name}_insert
+			AFTER INSERT ON {self.item_table_name} WHEN new.content_hash IS NULL BEGIN
+				INSERT INTO {self.search_table_name} (rowid, title, content)
+				VALUES (new.rowid, new.title, new.content);
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER {self.search_table_name}_delete
+			AFTER DELETE ON {self.item_table_name} WHEN old.content_hash IS NULL BEGIN
+				INSERT INTO {self.search_table_name} ({self.search_table_name}, rowid, title, content)
+				VALUES ('delete', old.rowid, old.title, old.content);
+			END;
+		"""
+        )
+        conn.execute(
+            f"""
+			CREATE TRIGGER {self.search_table_name}_update
+			AFTER UPDATE OF title, content, content_hash ON {self.item_table_name} BEGIN
+				INSERT INTO {self.search_table_name} ({self.search_table_name}, rowid, title, content)
+				SELECT 'delete', old.rowid, old.title, old.content
+				WHERE old.content_hash IS NULL;
+				INSERT INTO {self.search_table_name} (rowid, title, content)
+				SELECT new.rowid, new.title, new.content
+				WHERE new.content_hash IS NULL;
+			END;
+		"""
+        )
+
+    def _search_content(self, conn):
+        """The table the search index reads the items' text from, for the
+        snippets and rebuilds: item, or the item_text view once some contents
+        are compressed"""
+        sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = ?", (self.search_table_name,)
+        ).fetchone()[0]
+        if f"content='{self.text_view_name}'" in sql:
+            return self.text_view_name
+        return self.item_table_name
+
+    def _set_search_content(self, conn, table):
+        # The view calls inflate(), which only this module's connections have,
+        # so a database without compressed contents doesn't use it and other
+        # clients can read its index too. The index is rebuilt, it can't be
+        # told to read from elsewhere.
+        if self._search_content(conn) == table:
+            return
+
+        conn.execute(f"DROP TABLE {self.search_table_name}")
+        if table == self.text_view_name:
+            conn.execute(
+                f"""
+				CREATE VIEW IF NOT EXISTS {self.text_view_name} AS
+				SELECT rowid, title, {self._content_sql(self.item_table_name)} AS content
+				FROM {self.item_table_name};
+			"""
+            )
+        else:
+            conn.execute(f"DROP VIEW IF EXISTS {self.text_view_name}")
+
+        conn.execute(
+            f"""
+			CREATE VIRTUAL TABLE {self.search_table_name} USING fts5(
+				title,
+				content,
+				content='{table}',
+				content_rowid='rowid',
+				tokenize='unicode61 remove_diacritics 2'
+			);
+		"""
         )
-        self.conn.commit()
+        self._rebuild_search_index(conn)
+
+    def _search_compressed(self, conn):
+        """Have the search index read the compressed contents too, before
+        storing the first one"""
+        self._set_search_content(conn, self.text_view_name)
+
+    def _search_inline_items(self, conn):
+        # until some contents are compressed, see _set_search_content
+        has_compressed = conn.execute(
+            f"SELECT 1 FROM {self.item_table_name} WHERE content_hash IS NOT NULL LIMIT 1"
+        ).fetchone()
+        if not has_compressed:
+            self._set_search_content(conn, self.item_table_name)
+
+    def _add_channel_document_digest(self, conn):
+        # the hash of the last document parsed, see ParseCache
+        conn.execute(
+            f"ALTER TABLE {self.channel_table_name} ADD COLUMN document_digest BLOB"
+        )
+
+    def _add_item_first_seen(self, conn):
+        # When the item was stored, its age for the retention policies when
+        # it has no pubDate (a date of 0). The ones stored before are taken as
+        # seen now, not knowing better.
+        conn.execute(
+            f"ALTER TABLE {self.item_table_name} ADD COLUMN first_seen INTEGER"
+        )
+        conn.execute(
+            f"UPDATE {self.item_table_name} SET first_seen = ? WHERE date = 0",
+            (int(time.time()),),
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS item_channel_age ON {self.item_table_name} (channel, {self._AGE_SQL}, id)"
+        )
+
+    def _add_retention_policy(self, conn):
+        # The RetentionPolicy of each channel having its own, and the one of
+        # the others under an empty channel id, see prune()
+        conn.execute(
+            f"""
+			CREATE TABLE IF NOT EXISTS {self.retention_table_name} (
+				channel			VARCHAR(36) NOT NULL PRIMARY KEY,
+				max_items		INTEGER,
+				max_age			REAL,
+				keep_unread		INTEGER NOT NULL,
+				keep_starred	INTEGER NOT NULL
+			);
+		"""
+        )
+
+    # Schema changes since the tables of _create_db (version 0), in order. A
+    # database only runs the ones after its version, each in its own
+    # transaction. Never change or remove one, just add another.
+    MIGRATIONS = [
+        _add_item_indexes,
+        _add_item_search,
+        _add_item_content,
+        _add_item_retention,
+        _add_channel_stats,
+        _add_channel_http_validators,
+        _add_channel_poll_hints,
+        _add_plain_search_triggers,
+        _add_channel_document_digest,
+        _search_inline_items,
+        _add_item_first_seen,
+        _add_retention_policy,
+    ]
+
+    def _rebuild_channel_stats(self, conn):
+        conn.execute(f"DELETE FROM {self.stats_table_name}")
+        conn.execute(
+            f"""
+			INSERT INTO {self.stats_table_name} (channel, total, unread, newest)
+			SELECT channel, COUNT(*), SUM(read = 0), MAX(date)
+			FROM {self.item_table_name} GROUP BY channel
+		"""
+        )
+
+    def rebuild_channel_stats(self):
+        """Count again every channel's items, in case the counters got out of
+        sync"""
+        with self._write() as conn:
+            self._rebuild_channel_stats(conn)
+
+    def channel_stats(self):
+        """The item counters of every channel, by id: its total and unread
+        items and the date of the newest one (None if it has no items)"""
+        with self._read() as conn:
+            rows = conn.execute(
+                f"""
+				SELECT channel.id, COALESCE(stats.total, 0), COALESCE(stats.unread, 0),
+					stats.newest
+				FROM {self.channel_table_name} AS channel
+				LEFT JOIN {self.stats_table_name} AS stats ON stats.channel = channel.id
+			"""
+            ).fetchall()
+
+        return {
+            id: {"total": total, "unread": unread, "newest": newest}
+            for id, total, unread, newest in rows
+        }
+
+    def _rebuild_search_index(self, conn):
+        conn.execute(
+            f"INSERT INTO {self.search_table_name} ({self.search_table_name}) VALUES ('rebuild')"
+        )
+
+    def rebuild_search_index(self):
+        """Index again every item, in case the index got out of sync"""
+        with self._write() as conn:
+            self._rebuild_search_index(conn)
+
+    def search(self, query, channel=None, limit=20, offset=0):
+        """Items whose title or content match the query (in sqlite's fts5
+        syntax, ex: 'python AND "rss reader"'), best matches first. Each one
+        is a dict with its id, channel, title, link, date, read, a snippet of
+        the text around the match (marked with <b></b>) and its rank."""
+        where = f"{self.search_table_name} MATCH ?"
+        params = [query]
+        if channel is not None:
+            where += " AND item.channel = ?"
+            params.append(channel)
+
+        columns = ("id", "channel", "title", "link", "date", "read", "snippet", "rank")
+        try:
+            with self._read() as conn:
+                rows = conn.execute(
+                    f"""
+				SELECT item.id, item.channel, item.title, item.link, item.date,
+					item.read,
+					snippet({self.search_table_name}, -1, '<b>', '</b>', '…', 16),
+					{self.search_table_name}.rank
+				FROM {self.search_table_name}
+				JOIN {self.item_table_name} AS item
+					ON item.rowid = {self.search_table_name}.rowid
+				WHERE {where}
+				ORDER BY {self.search_table_name}.rank
+				LIMIT ? OFFSET ?
+			""",
+                    (*params, limit, offset),
+                ).fetchall()
+        except sqlite3.OperationalError as ex:
+            raise FeedError(f'Invalid search query "{query}": {ex}') from ex
+
+        results = [dict(zip(columns, row)) for row in rows]
+        for result in results:
+            result["read"] = bool(result["read"])
+
+        return results
+
+    @property
+    def schema_version(self):
+        with self._read() as conn:
+            row = conn.execute(
+                f"SELECT version FROM {self.version_table_name}"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _migrate(self):
+        with self._write() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.version_table_name} (version INTEGER NOT NULL)"
+            )
+        version = self.schema_version
+
+        for number, migration in enumerate(self.MIGRATIONS[version:], version + 1):
+            try:
+                with self._write() as conn:
+                    migration(self, conn)
+                    conn.execute(f"DELETE FROM {self.version_table_name}")
+                    conn.execute(
+                        f"INSERT INTO {self.version_table_name} (version) VALUES (?)",
+                        (number,),
+                    )
+            except Exception as ex:
+                raise FeedError(
+                    f"Could not upgrade the database to version {number}: {ex}"
+                ) from ex
 
     def subscribe(self, callback):
         self._callback = callback
 
     def close(self):
-        self.cursor.close()
-        self.conn.commit()
-        self.conn.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+        with self._write_lock:
+            self.conn.close()
 
     def channel_exists(self, id):
-        self.cursor.execute(
-            f"SELECT name FROM {self.channel_table_name} WHERE id=?", (id,)
-        )
-        exists = len(self.cursor.fetchall()) == 1
+        with self._read() as conn:
+            rows = conn.execute(
+                f"SELECT name FROM {self.channel_table_name} WHERE id=?", (id,)
+            ).fetchall()
+        exists = len(rows) == 1
         return exists
 
+    def http_validators(self, channel_id):
+        """The ETag, Last-Modified and length of the channel's last fetched
+        document, None for those unknown"""
+        with self._read() as conn:
+            row = conn.execute(
+                f"SELECT etag, last_modified, content_length FROM {self.channel_table_name} WHERE id=?",
+                (channel_id,),
+            ).fetchone()
+
+        row = row or (None, None, None)
+        return dict(zip(("etag", "last_modified", "content_length"), row))
+
+    def set_http_validators(self, channel_id, etag, last_modified, content_length):
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE {self.channel_table_name} SET etag=?, last_modified=?, content_length=? WHERE id=?",
+                (etag, last_modified, content_length, channel_id),
+            )
+
+    def document_digest(self, channel_id):
+        """The hash of the channel's last document parsed, see ParseCache"""
+        with self._read() as conn:
+            row = conn.execute(
+                f"SELECT document_digest FROM {self.channel_table_name} WHERE id=?",
+                (channel_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_document_digest(self, channel_id, digest):
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE {self.channel_table_name} SET document_digest=? WHERE id=?",
+                (digest, channel_id),
+            )
+
+    def set_poll_hints(self, channel_id, ttl, skip_hours, skip_days):
+        """Store the ttl (minutes), skip hours and skip days of the channel's
+        document, None for those it doesn't have"""
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE {self.channel_table_name} SET ttl=?, skip_hours=?, skip_days=? WHERE id=?",
+                (
+                    ttl,
+                    ",".join(map(str, skip_hours)) if skip_hours else None,
+                    ",".join(skip_days) if skip_days else None,
+                    channel_id,
+                ),
+            )
+
+    @property
+    def channel_poll_hints(self):
+        """The ttl, skip_hours and skip_days of every channel, by link"""
+        with self._read() as conn:
+            rows = conn.execute(
+                f"SELECT link, ttl, skip_hours, skip_days FROM {self.channel_table_name}"
+            ).fetchall()
+
+        return {
+            link: {
+                "ttl": ttl,
+                "skip_hours": [int(hour) for hour in hours.split(",")] if hours else [],
+                "skip_days": days.split(",") if days else [],
+            }
+            for link, ttl, hours, days in rows
+        }
+
     def _feed_exists(self, id, channel_id):
-        self.cursor.execute(
-            f"SELECT title FROM {self.item_table_name} WHERE id=? and channel=?",
-            (id, channel_id),
-        )
-        exists = len(self.cursor.fetchall()) == 1
+        """Whether the item is stored, or was and got pruned"""
+        with self._read() as conn:
+            rows = conn.execute(
+                f"""
+				SELECT 1 FROM {self.item_table_name} WHERE id=? and channel=?
+				UNION ALL
+				SELECT 1 FROM {self.pruned_table_name} WHERE id=? and channel=?
+			""",
+                (id, channel_id, id, channel_id),
+            ).fetchall()
+        exists = len(rows) >= 1
         return exists
 
     def add_channel(self, name, url):
         ch_id = uuid_from_url(url)
-        if self.channel_exists(ch_id):
-            raise FeedError(f'"{name}" channel (of id: {ch_id}) already exists')
+        with self._write() as conn:
+            if self.channel_exists(ch_id):
+                raise FeedError(f'"{name}" channel (of id: {ch_id}) already exists')
 
-        self.cursor.execute(
-            f"INSERT INTO {self.channel_table_name} (id, name, link) VALUES (?,?,?)",
-            (ch_id, name, url),
-        )
-        self.conn.commit()
+            conn.execute(
+                f"INSERT INTO {self.channel_table_name} (id, name, link) VALUES (?,?,?)",
+                (ch_id, name, url),
+            )
         return ch_id
 
     def add_feed_item(self, title, content, link, item_id, date, channel_id):
-        if self._feed_exists(item_id, channel_id):
-            # ignore if already exists...
+        with self._write() as conn:
+            if self._feed_exists(item_id, channel_id):
+                # ignore if already exists...
+                return
+
+            item = {
+                "title": title,
+                "link": link,
+                "id": item_id,
+                "date": date,
+                "read": False,
+                "starred": False,
+                # may be a lazily decoded description, see parse_rss
+                "content": str(content),
+                "channel": channel_id,
+            }
+            self._insert_items(conn, [item])
+
+            # Notify of new items
+            # TODO: since this already is returning the item, maybe create a
+            # new method just to check if is a new item and notify? But
+            # in this case we should add a func only to load the items
+            # that already are on the json.
+            # NOTE: the callback runs on the thread that added the item (the
+            # writer's one with a WriteQueue), which may not be the ui's one.
+            # If the callback does something on the thread and never returns
+            # (like  funcs calling other funcs forever..) we may encounter
+            # some troubles
+            self._notify([item])
+
+        return item
+
+    # sqlite's default limit of host parameters per statement is 999
+    _MAX_PARAMETERS = 500
+
+    # shorter contents are not worth their hash and zlib's header
+    COMPRESS_MIN_SIZE = 128
+
+    def _store_content(self, conn, contents):
+        """Store the compressed contents that are not stored yet and return
+        the hash of each one, None for those kept inline"""
+        hashes = []
+        new = {}
+        for content in contents:
+            data = content.encode("utf-8")
+            if len(data) < self.COMPRESS_MIN_SIZE:
+                hashes.append(None)
+                continue
+
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            if digest not in new:
+                new[digest] = (digest, zlib.compress(data, 9), len(data))
+            hashes.append(digest)
+
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {self.content_table_name} (hash, data, size) VALUES (?,?,?)",
+            new.values(),
+        )
+        return hashes
+
+    def _index_compressed(self, conn, where, params, delete=False):
+        """Add the compressed items matching `where` to the search index, or
+        remove them from it, as the triggers do for the inline ones"""
+        command = "'delete', " if delete else ""
+        column = f"{self.search_table_name}, " if delete else ""
+        conn.executemany(
+            f"""
+			INSERT INTO {self.search_table_name} ({column}rowid, title, content)
+			SELECT {command}rowid, title, {self._content_sql(self.item_table_name)}
+			FROM {self.item_table_name} WHERE content_hash IS NOT NULL AND {where}
+		""",
+            params,
+        )
+
+    def _insert_items(self, conn, items):
+        seen = int(time.time())
+        if not self.compress_content:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {self.item_table_name} (id, title, content, link, date, channel, first_seen) VALUES (?,?,?,?,?,?,?)",
+                (
+                    (
+                        item["id"],
+                        item["title"],
+                        item["content"],
+                        item["link"],
+                        item["date"],
+                        item["channel"],
+                        seen,
+                    )
+                    for item in items
+                ),
+            )
             return
 
-        self.cursor.execute(
-            f"INSERT INTO {self.item_table_name} (id, title, content, link, date, channel) VALUES (?,?,?,?,?,?)",
-            (item_id, title, content, link, date, channel_id),
+        hashes = self._store_content(conn, [item["content"] for item in items])
+        if any(hashes):
+            self._search_compressed(conn)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {self.item_table_name} (id, title, content, content_hash, link, date, channel, first_seen) VALUES (?,?,?,?,?,?,?,?)",
+            (
+                (
+                    item["id"],
+                    item["title"],
+                    "" if digest else item["content"],
+                    digest,
+                    item["link"],
+                    item["date"],
+                    item["channel"],
+                    seen,
+                )
+                for item, digest in zip(items, hashes)
+            ),
+        )
+        self._index_compressed(
+            conn,
+            "id = ?",
+            ((item["id"],) for item, digest in zip(items, hashes) if digest),
         )
-        self.conn.commit()
 
-        item = {
-            "title": title,
-            "link": link,
-            "id": item_id,
-            "date": date,
-            "read": False,
-            "content": content,
-            "channel": channel_id,
-        }
+    def _existing_item_ids(self, conn, item_ids):
+        existing = set()
+        # each id is a parameter of both selects
+        size = self._MAX_PARAMETERS // 2
+        for start in range(0, len(item_ids), size):
+            chunk = item_ids[start : start + size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"""
+				SELECT id FROM {self.item_table_name} WHERE id IN ({placeholders})
+				UNION ALL
+				SELECT id FROM {self.pruned_table_name} WHERE id IN ({placeholders})
+			""",
+                chunk * 2,
+            )
+            existing.update(row[0] for row in rows.fetchall())
 
-        # Notify of new items
-        # TODO: since this already is returning the item, maybe create a
-        # new method just to check if is a new item and notify? But
-        # in this case we should add a func only to load the items
-        # that already are on the json.
-        # NOTE: since we don't call it on another thread, if the
-        # callback does something on the thread and never
-        # returns (like  funcs calling other funcs forever..)
-        # we may encounter some troubles
-        if self._callback is not None:
-            self._callback(item)
+        return existing
 
-        return item
+    def add_feed_items(self, items):
+        """Store many items in a single transaction.
+
+        `items` is an iterable of (title, content, link, item_id, date,
+        channel_id) tuples, the arguments of add_feed_item. Items that are
+        already stored are ignored, the new ones are returned (and notified)
+        just like add_feed_item does."""
+        rows = {}
+        for title, content, link, item_id, date, channel_id in items:
+            # the first one wins, as it would calling add_feed_item for each
+            rows.setdefault(item_id, (title, content, link, item_id, date, channel_id))
+
+        with self._write() as conn:
+            existing = self._existing_item_ids(conn, list(rows))
+            new_items = [
+                {
+                    "title": title,
+                    "link": link,
+                    "id": item_id,
+                    "date": date,
+                    "read": False,
+                    "starred": False,
+                    # may be a lazily decoded description, see parse_rss
+                    "content": str(content),
+                    "channel": channel_id,
+                }
+                for title, content, link, item_id, date, channel_id in rows.values()
+                if item_id not in existing
+            ]
+
+            self._insert_items(conn, new_items)
+            self._notify(new_items)
+
+        return new_items
+
+    def compress_stored_content(self, batch_size=1000):
+        """Move the contents stored inline (like all of those stored before
+        compress_content existed) to the compressed table, `batch_size` items
+        per transaction. Returns how many were moved."""
+        moved = 0
+        last = 0
+        while True:
+            with self._write() as conn:
+                rows = conn.execute(
+                    f"""
+					SELECT rowid, content FROM {self.item_table_name}
+					WHERE content_hash IS NULL AND rowid > ?
+					ORDER BY rowid LIMIT ?
+				""",
+                    (last, batch_size),
+                ).fetchall()
+                if not rows:
+                    return moved
+
+                last = rows[-1][0]
+                hashes = self._store_content(conn, [row[1] for row in rows])
+                if any(hashes):
+                    self._search_compressed(conn)
+                updates = [
+                    (digest, rowid)
+                    for (rowid, _), digest in zip(rows, hashes)
+                    if digest is not None
+                ]
+                conn.executemany(
+                    f"UPDATE {self.item_table_name} SET content='', content_hash=? WHERE rowid=?",
+                    updates,
+                )
+                self._index_compressed(
+                    conn, "rowid = ?", ((rowid,) for _, rowid in updates)
+                )
+                moved += len(updates)
+
+    def content_storage_stats(self):
+        """How much space the item contents take, inline and compressed"""
+        with self._read() as conn:
+            inline_items, inline_bytes = conn.execute(
+                f"""
+				SELECT COUNT(*), COALESCE(SUM(length(CAST(content AS BLOB))), 0)
+				FROM {self.item_table_name} WHERE content_hash IS NULL
+			"""
+            ).fetchone()
+            compressed_items = conn.execute(
+                f"SELECT COUNT(*) FROM {self.item_table_name} WHERE content_hash IS NOT NULL"
+            ).fetchone()[0]
+            contents, stored_bytes, compressed_bytes = conn.execute(
+                f"""
+				SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(data)), 0)
+				FROM {self.content_table_name}
+			"""
+            ).fetchone()
+
+        return {
+            "inline_items": inline_items,
+            "inline_bytes": inline_bytes,
+            "compressed_items": compressed_items,
+            # distinct contents, fewer than the items when they are shared
+            "contents": contents,
+            "uncompressed_bytes": stored_bytes,
+            "compressed_bytes": compressed_bytes,
+        }
 
     def mark_feed_item_as(self, channel_id, item_id, is_read):
-        if not self._feed_exists(item_id, channel_id):
+        with self._write() as conn:
+            updated = conn.execute(
+                f"UPDATE {self.item_table_name} SET read=? WHERE channel=? AND id=?",
+                (int(is_read), channel_id, item_id),
+            ).rowcount
+
+        if not updated:
             raise FeedError(
                 f"Could not set feed's reading status. The item with {item_id} id does not exists"
             )
 
-        self.cursor.execute(
-            f"UPDATE {self.item_table_name} SET read=? WHERE id=?",
-            (int(is_read), item_id),
+    # The bulk ones below only touch the items whose status actually changes
+    # and return how many they were.
+
+    def mark_feed_items_as(self, channel_id, item_ids, is_read):
+        """Set the reading status of many items of a channel at once"""
+        item_ids = list(item_ids)
+        updated = 0
+        with self._write() as conn:
+            for start in range(0, len(item_ids), self._MAX_PARAMETERS):
+                chunk = item_ids[start : start + self._MAX_PARAMETERS]
+                placeholders = ",".join("?" * len(chunk))
+                updated += conn.execute(
+                    f"UPDATE {self.item_table_name} SET read=? WHERE channel=? AND read!=? AND id IN ({placeholders})",
+                    (int(is_read), channel_id, int(is_read), *chunk),
+                ).rowcount
+
+        return updated
+
+    def mark_channel_as(self, channel_id, is_read):
+        """Set the reading status of every item of a channel"""
+        with self._write() as conn:
+            return conn.execute(
+                f"UPDATE {self.item_table_name} SET read=? WHERE channel=? AND read!=?",
+                (int(is_read), channel_id, int(is_read)),
+            ).rowcount
+
+    def mark_older_than(self, date, is_read=True, channel_id=None):
+        """Set the reading status of the items (of a channel, or all of them)
+        dated before the `date` timestamp"""
+        where = "date<? AND read!=?"
+        params = [int(is_read), date, int(is_read)]
+        if channel_id is not None:
+            where = "channel=? AND " + where
+            params.insert(1, channel_id)
+
+        with self._write() as conn:
+            return conn.execute(
+                f"UPDATE {self.item_table_name} SET read=? WHERE {where}", params
+            ).rowcount
+
+    def mark_feed_item_starred(self, channel_id, item_id, is_starred):
+        with self._write() as conn:
+            updated = conn.execute(
+                f"UPDATE {self.item_table_name} SET starred=? WHERE channel=? AND id=?",
+                (int(is_starred), channel_id, item_id),
+            ).rowcount
+
+        if not updated:
+            raise FeedError(
+                f"Could not star the feed's item. The item with {item_id} id does not exists"
+            )
+
+    def set_retention_policy(self, policy, channel_id=None):
+        """Store the RetentionPolicy of a channel, or the one of the channels
+        without their own if no channel is given. None keeps everything."""
+        with self._write() as conn:
+            if policy is None:
+                conn.execute(
+                    f"DELETE FROM {self.retention_table_name} WHERE channel=?",
+                    (channel_id or "",),
+                )
+                return
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.retention_table_name} (channel, max_items, max_age, keep_unread, keep_starred) VALUES (?,?,?,?,?)",
+                (
+                    channel_id or "",
+                    policy.max_items,
+                    policy.max_age,
+                    int(policy.keep_unread),
+                    int(policy.keep_starred),
+                ),
+            )
+
+    def retention_policies(self):
+        """The stored RetentionPolicy of each channel having its own, and the
+        one of the others under None"""
+        with self._read() as conn:
+            rows = conn.execute(
+                f"SELECT channel, max_items, max_age, keep_unread, keep_starred FROM {self.retention_table_name}"
+            ).fetchall()
+        return {
+            channel_id or None: RetentionPolicy(
+                max_items, max_age, bool(keep_unread), bool(keep_starred)
+            )
+            for channel_id, max_items, max_age, keep_unread, keep_starred in rows
+        }
+
+    def get_retention_policy(self, channel_id):
+        policies = self.retention_policies()
+        return policies.get(channel_id, policies.get(None))
+
+    # how many pruned ids are remembered per channel, more than a document
+    # usually lists
+    PRUNED_IDS_KEPT = 1000
+
+    # the date an item's age is counted from: its pubDate, or when it was
+    # first seen for those without one. Written as item_channel_age indexes it.
+    _AGE_SQL = "COALESCE(NULLIF(date, 0), first_seen, 0)"
+
+    def _prune_batch(self, conn, channel_id, policy, now, batch_size):
+        where = ["channel = ?"]
+        params = [channel_id]
+        limits = []
+        age = self._AGE_SQL
+        if policy.max_age is not None:
+            limits.append(f"{age} < ?")
+            params.append(now - policy.max_age)
+        if policy.max_items is not None:
+            # older than the newest max_items ones
+            limits.append(
+                f"""({age}, id) <= (
+					SELECT {age}, id FROM {self.item_table_name} WHERE channel = ?
+					ORDER BY {age} DESC, id DESC LIMIT 1 OFFSET ?
+				)"""
+            )
+            params.extend((channel_id, policy.max_items))
+        if not limits:
+            return 0
+
+        where.append(f"({' OR '.join(limits)})")
+        if policy.keep_unread:
+            where.append("read = 1")
+        if policy.keep_starred:
+            where.append("starred = 0")
+
+        rows = conn.execute(
+            f"""
+			SELECT rowid, id, {age}, content_hash FROM {self.item_table_name}
+			WHERE {' AND '.join(where)} LIMIT ?
+		""",
+            (*params, batch_size),
+        ).fetchall()
+        if not rows:
+            return 0
+
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {self.pruned_table_name} (id, channel, date) VALUES (?,?,?)",
+            ((id, channel_id, date) for _, id, date, _ in rows),
+        )
+        self._index_compressed(
+            conn,
+            "rowid = ?",
+            ((rowid,) for rowid, *_, digest in rows if digest is not None),
+            delete=True,
+        )
+        conn.executemany(
+            f"DELETE FROM {self.item_table_name} WHERE rowid = ?",
+            ((rowid,) for rowid, *_ in rows),
         )
-        self.conn.commit()
+        # only after the items, as long as one uses a content it is kept
+        conn.executemany(
+            f"""
+			DELETE FROM {self.content_table_name} WHERE hash = ?
+			AND NOT EXISTS (SELECT 1 FROM {self.item_table_name} WHERE content_hash = ?)
+		""",
+            {(digest, digest) for *_, digest in rows if digest is not None},
+        )
+        return len(rows)
+
+    def prune(self, now=None, batch_size=500, vacuum=True):
+        """Delete the items left out by the retention policies, `batch_size`
+        at a time so other writes don't wait for long, and give the space
+        back with incremental_vacuum() unless told not to. Returns how many
+        items were deleted."""
+        if now is None:
+            now = datetime.datetime.now().timestamp()
+
+        pruned = 0
+        policies = self.retention_policies()
+        for channel_id, _ in self.channel_id_and_title:
+            policy = policies.get(channel_id, policies.get(None))
+            if policy is None:
+                continue
+
+            while True:
+                with self._write() as conn:
+                    deleted = self._prune_batch(
+                        conn, channel_id, policy, now, batch_size
+                    )
+                pruned += deleted
+                if deleted < batch_size:
+                    break
+
+            with self._write() as conn:
+                conn.execute(
+                    f"""
+					DELETE FROM {self.pruned_table_name} WHERE channel = ? AND (date, id) < (
+						SELECT date, id FROM {self.pruned_table_name} WHERE channel = ?
+						ORDER BY date DESC, id DESC LIMIT 1 OFFSET ?
+					)
+				""",
+                    (channel_id, channel_id, self.PRUNED_IDS_KEPT - 1),
+                )
+
+        if vacuum:
+            while self.incremental_vacuum():
+                pass
+
+        return pruned
+
+    def incremental_vacuum(self, pages=256):
+        """Give back to the file system up to `pages` of the free pages left
+        by deleted rows. Returns how many were, so it can be called again
+        until it is 0 without blocking writes for long."""
+        with self._write() as conn:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            return free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+class WriteQueue:
+    """Runs the writes to a ChannelList on a thread of its own, so submitting
+    one returns right away with a future of its result.
+
+    The writes queued meanwhile are committed together: after taking one the
+    thread waits up to `max_delay` seconds for others, at most `max_batch` in
+    all, so a flood of small writes takes a few commits. Each one still runs
+    in a savepoint of its own, one that fails doesn't undo the others, and
+    the futures are only done once the transaction is committed."""
+
+    def __init__(self, feed, max_batch=256, max_delay=0.005):
+        self.feed = feed
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.commits = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._closed_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="syndicate-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, write, *args, **kwargs):
+        """Queue a call of `write` (ex: feed.mark_feed_item_as) with the given
+        arguments, returning a concurrent.futures.Future of its result"""
+        future = concurrent.futures.Future()
+        with self._closed_lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit writes to a closed WriteQueue")
+            self._queue.put((future, write, args, kwargs))
+        return future
+
+    def close(self):
+        """Stop the thread once the writes already queued are committed"""
+        with self._closed_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _next_batch(self):
+        write = self._queue.get()
+        if write is None:
+            return None
+
+        batch = [write]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                write = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if write is None:
+                # stop after this one
+                self._queue.put(None)
+                break
+            batch.append(write)
+
+        return batch
+
+    def _run(self):
+        while (batch := self._next_batch()) is not None:
+            self._commit(batch)
+
+    def _commit(self, batch):
+        results = []
+        try:
+            with self.feed._write():
+                for future, write, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        results.append(None)
+                        continue
+
+                    try:
+                        with self.feed._write():
+                            results.append((write(*args, **kwargs), None))
+                    except Exception as ex:
+                        results.append((None, ex))
+        except Exception as ex:
+            # the commit failed, none of them is stored
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(ex)
+            return
+
+        self.commits += 1
+        for (future, *_), result in zip(batch, results):
+            if result is None:
+                continue
+            value, ex = result
+            if ex is None:
+                future.set_result(value)
+            else:
+                future.set_exception(ex)
 
 
 # FIXME: it seems it doesnt add a second channel to the feed
@@ -209,30 +1705,277 @@ def mili_to_date(float):
 def str_date_to_mili(str_date: str) -> int:
     """Construct a POSIX timestamp from a date string."""
     try:
-        return int(dateutil.parser.parse((str_date)).timestamp())
+        return int(parse_date(str_date).timestamp())
     except ValueError as ex:
         print("str_date_to_mili:", str_date, ex)
         return 0
 
 
-def fetch_rss(url):
+def _counting_adapter(adapter_class, count):
+    """A subclass of the requests' HTTPAdapter telling `count` of each request
+    it sends and each connection its pools open, by host. Only through
+    public hooks: send(), init_poolmanager() and the pools' ConnectionCls."""
+    from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+    def counting_pool(pool_class):
+        class Connection(pool_class.ConnectionCls):
+            def connect(self):
+                count(self.host, connections=1)
+                super().connect()
+
+        return type(
+            pool_class.__name__, (pool_class,), {"ConnectionCls": Connection}
+        )
+
+    pool_classes = {
+        "http": counting_pool(HTTPConnectionPool),
+        "https": counting_pool(HTTPSConnectionPool),
+    }
+
+    class CountingAdapter(adapter_class):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = pool_classes
+
+        def send(self, request, *args, **kwargs):
+            count(urllib.parse.urlsplit(request.url).hostname, requests=1)
+            return super().send(request, *args, **kwargs)
+
+    return CountingAdapter
+
+
+class FeedSession:
+    """The HTTP session the feeds are fetched with. Its connections are kept
+    alive and pooled, up to `pool_maxsize` per host for `pool_connections`
+    hosts (size them to the refresh's per host and global concurrency), so
+    the feeds of a host don't each pay for a new TCP and TLS handshake.
+    Bodies are asked for compressed and decoded as they are read."""
+
+    def __init__(self, pool_connections=16, pool_maxsize=2):
+        # only imported once something is to be fetched, it takes longer
+        # than the rest of the module (see main)
+        import requests
+
+        # host -> [connections opened, requests sent], kept apart from the
+        # pools since the adapter drops the least recently used ones when
+        # there are more hosts than pools
+        self._counters = {}
+        self._counters_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = _counting_adapter(requests.adapters.HTTPAdapter, self._count)(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _count(self, host, connections=0, requests=0):
+        with self._counters_lock:
+            counters = self._counters.setdefault(host, [0, 0])
+            counters[0] += connections
+            counters[1] += requests
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def connection_stats(self):
+        """By host: how many connections were opened, how many requests went
+        through them and so how many of those reused a connection"""
+        with self._counters_lock:
+            counters = {host: list(c) for host, c in self._counters.items()}
+
+        return {
+            host: {
+                "connections": connections,
+                "requests": requests,
+                "reused": requests - connections,
+            }
+            for host, (connections, requests) in counters.items()
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def default_session():
+    """The FeedSession of the fetches not given one, created on first use"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = FeedSession()
+    return _default_session
+
+
+# the limits of a feed's download, so a runaway one can't take all the memory
+# or hold a refresh forever
+MAX_FEED_SIZE = 16 * 1024 * 1024
+FETCH_DEADLINE = 30  # seconds
+
+
+def _read_body(
+    response,
+    max_size=MAX_FEED_SIZE,
+    deadline=FETCH_DEADLINE,
+    chunk_size=XmlParser.CHUNK_SIZE,
+):
+    """Yield the (decompressed) body of a streamed response in pieces of
+    `chunk_size`, raising FeedError once it goes over `max_size` bytes or
+    takes more than `deadline` seconds"""
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_size:
+        response.close()
+        raise FeedError(f"{response.url} is {length} bytes, over {max_size}")
+
+    ends = time.monotonic() + deadline
+    size = 0
+    with response:
+        # read1() returns whatever arrived, up to chunk_size, where
+        # iter_content() would wait for a whole chunk: a server sending a few
+        # bytes at a time, each within the socket timeout, could hold it for
+        # hours. The deadline is checked between them instead.
+        while chunk := response.raw.read1(chunk_size, decode_content=True):
+            size += len(chunk)
+            if size > max_size:
+                raise FeedError(f"{response.url} is over {max_size} bytes")
+            if time.monotonic() > ends:
+                raise FeedError(f"{response.url} took over {deadline} seconds")
+            yield chunk
+
+
+def fetch_rss(url, session=None, max_size=MAX_FEED_SIZE, deadline=FETCH_DEADLINE):
     # TODO: error handling when is not 200
-    return requests.get(url, timeout=2).text
+    # The raw bytes, the parser finds out the encoding from the document
+    # itself instead of requests guessing it and decoding the whole thing
+    response = (session or default_session()).get(url, timeout=2, stream=True)
+    return b"".join(_read_body(response, max_size, deadline))
+
+
+def fetch_feed(
+    feed,
+    url,
+    timeout=2,
+    session=None,
+    max_size=MAX_FEED_SIZE,
+    deadline=FETCH_DEADLINE,
+):
+    """Fetch the channel's document unless it didn't change since the last one
+    stored (then the response is a 304 without content), as a FeedResponse
+    to pass on to parse_rss. See _read_body for `max_size` and `deadline`."""
+    headers = {}
+    validators = feed.http_validators(uuid_from_url(url))
+    if validators["etag"]:
+        headers["If-None-Match"] = validators["etag"]
+    if validators["last_modified"]:
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    session = session or default_session()
+    response = session.get(url, headers=headers, timeout=timeout, stream=True)
+    if response.status_code == 304:
+        # no body, reading it gives the connection back to the pool
+        response.content
+        return FeedResponse(url, None, status=304, **validators)
 
+    if not response.ok:
+        response.close()
+        response.raise_for_status()
+    content = b"".join(_read_body(response, max_size, deadline))
+    return FeedResponse(
+        url,
+        content,
+        status=response.status_code,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        content_length=len(content),
+    )
 
-def parse_rss(feed, content, url, channel_name=""):
-    channel = RssParser(content).parse()
 
+def stream_feed_items(
+    url,
+    timeout=2,
+    session=None,
+    max_size=MAX_FEED_SIZE,
+    deadline=FETCH_DEADLINE,
+    chunk_size=8 * 1024,
+):
+    """Yield the items (model.FeedItem) of a feed as they are downloaded: the
+    body goes into the parser up to `chunk_size` bytes at a time, so the
+    first items come before the download ends and only about a chunk and an
+    item are in memory at once. See _read_body for `max_size` and `deadline`.
+
+    NOTE: the refresh path (fetch_feed, parse_rss) doesn't use it. The
+    document's hash has to be known before parsing to skip unchanged ones
+    (see ParseCache), and the compact items of known channels keep their
+    description as a span of the whole buffer, so it is read whole there,
+    bounded by `max_size`."""
+    session = session or default_session()
+    response = session.get(url, timeout=timeout, stream=True)
+    if not response.ok:
+        response.close()
+        response.raise_for_status()
+    chunks = _read_body(response, max_size, deadline, chunk_size)
+    yield from RssParser(chunks).iter_items()
+
+
+def parse_rss(feed, content, url, channel_name="", ordered=True, stop_after=5):
+    """Store the items of the feed's document that are not stored yet.
+
+    The document may be a FeedResponse, then nothing is done for a 304 and
+    its validators are stored along with the items otherwise.
+
+    When refreshing a known channel the document stops being parsed after
+    `stop_after` stored items in a row, unless the feed is not `ordered`
+    newest first.
+
+    Returns the new items, as add_feed_items does."""
     ch_id = uuid_from_url(url)
-    channel_name = channel_name or channel.title
+
+    response = None
+    if isinstance(content, FeedResponse):
+        if content.not_modified:
+            return []
+        response, content = content, content.content
+
+    if XmlParser.is_file(content) and not content.seekable():
+        content = content.read()
+
+    # a poll that returns the very same document has nothing new to add
+    digest, size = feed.parse_cache.digest(content)
+    if feed.parse_cache.is_unchanged(ch_id, digest, size):
+        _store_http_validators(feed, ch_id, response)
+        return []
+
     if not feed.channel_exists(ch_id):
+        channel = RssParser(content).parse()
+        channel_name = channel_name or channel.title
         ch_id = feed.add_channel(
             channel_name, url
         )  # feed's url, not the embeded link inside of it
+        hints = {
+            "ttl": channel.ttl,
+            "skip_hours": channel.skip_hours,
+            "skip_days": channel.skip_days,
+        }
+        items = channel.items.values()
+    else:
+        # both read it whole, once is enough
+        if XmlParser.is_file(content):
+            content = XmlParser.utf8_buffer(content)
+        parser = RssParser(content)
+        # the feed may have changed them, or the channel be older than them
+        hints = parser.parse_poll_hints()
+        # most items are already stored, the compact ones only decode their
+        # description when add_feed_items finds out they are new
+        items = parser.iter_new_items(
+            KnownItemIds(feed, ch_id), stop_after=stop_after, ordered=ordered
+        )
 
-
-    for  item in channel.items.values():
-        feed.add_feed_item(
+    new_items = feed.add_feed_items(
+        (
             item.title,
             item.description,
             item.link,
@@ -240,3 +1983,504 @@ def parse_rss(feed, content, url, channel_name=""):
             item.pub_date.timestamp() if item.pub_date else 0,
             ch_id,
         )
+        for item in items
+    )
+
+    feed.set_poll_hints(ch_id, **hints)
+    # only once everything is stored, so a failure is retried on the next poll
+    feed.parse_cache.store(ch_id, digest)
+    _store_http_validators(feed, ch_id, response)
+    return new_items
+
+
+def _store_http_validators(feed, ch_id, response):
+    if response is not None:
+        feed.set_http_validators(
+            ch_id, response.etag, response.last_modified, response.content_length
+        )
+
+
+class ChannelRefresh:
+    """How the refresh of a channel went: its `status` is "updated",
+    "not_modified" (a 304) or "failed" (see `error`). The times are in
+    seconds."""
+
+    def __init__(
+        self, url, status, new_items=0, fetch_time=0.0, parse_time=0.0, error=None
+    ):
+        self.url = url
+        self.channel_id = uuid_from_url(url)
+        self.status = status
+        self.new_items = new_items
+        self.fetch_time = fetch_time
+        self.parse_time = parse_time
+        self.error = error
+
+    def __repr__(self):
+        return (
+            f"<ChannelRefresh {self.status} {self.url} new_items={self.new_items} "
+            f"fetch_time={self.fetch_time:.3f} parse_time={self.parse_time:.3f}>"
+        )
+
+
+class RefreshReport:
+    """The ChannelRefresh of every channel refreshed, in the order they were
+    given, and how long the whole refresh took"""
+
+    def __init__(self, channels, elapsed):
+        self.channels = channels
+        self.elapsed = elapsed
+
+    @property
+    def new_items(self):
+        return sum(channel.new_items for channel in self.channels)
+
+    @property
+    def failed(self):
+        return [channel for channel in self.channels if channel.status == "failed"]
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __repr__(self):
+        return (
+            f"<RefreshReport {len(self.channels)} channels, {self.new_items} new "
+            f"items, {len(self.failed)} failed in {self.elapsed:.3f}s>"
+        )
+
+
+class Refresher:
+    """Fetches and stores the channels concurrently, on a pool of `workers`
+    threads. No more than `per_host` of them talk to the same host at a time,
+    so a host with many feeds isn't flooded and the others aren't left
+    waiting behind it. Unless given one, it has a FeedSession sized for it."""
+
+    def __init__(self, feed, workers=16, per_host=2, timeout=2, session=None):
+        self.feed = feed
+        self.workers = workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = session or FeedSession(
+            pool_connections=workers, pool_maxsize=per_host
+        )
+        self._hosts = {}  # host -> semaphore of its connections
+        self._hosts_lock = threading.Lock()
+
+    def _host_slots(self, url):
+        host = urllib.parse.urlsplit(url).hostname
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.per_host)
+            return self._hosts[host]
+
+    def _refresh_channel(self, url):
+        start = time.perf_counter()
+        try:
+            with self._host_slots(url):
+                response = fetch_feed(
+                    self.feed, url, timeout=self.timeout, session=self.session
+                )
+        except Exception as ex:
+            return ChannelRefresh(
+                url,
+                "failed",
+                fetch_time=time.perf_counter() - start,
+                error=f"{type(ex).__name__}: {ex}",
+            )
+
+        fetched = time.perf_counter()
+        status = "not_modified" if response.not_modified else "updated"
+        try:
+            new_items = parse_rss(self.feed, response, url)
+        except Exception as ex:
+            status, new_items = "failed", []
+            error = f"{type(ex).__name__}: {ex}"
+        else:
+            error = None
+
+        return ChannelRefresh(
+            url,
+            status,
+            new_items=len(new_items),
+            fetch_time=fetched - start,
+            parse_time=time.perf_counter() - fetched,
+            error=error,
+        )
+
+    @staticmethod
+    def _interleave_hosts(urls):
+        # one url of each host in turn, so the first ones in the queue aren't
+        # all waiting for the same host
+        by_host = {}
+        for url in urls:
+            by_host.setdefault(urllib.parse.urlsplit(url).hostname, []).append(url)
+
+        queues = list(by_host.values())
+        for i in range(max(map(len, queues), default=0)):
+            for urls in queues:
+                if i < len(urls):
+                    yield urls[i]
+
+    def refresh(self, urls=None):
+        """Refresh the given channels (all of them by default) and return a
+        RefreshReport. Parsing and storage happen on the same threads as the
+        downloads, storage being done one channel at a time."""
+        start = time.perf_counter()
+        urls = list(self.feed.channel_links if urls is None else urls)
+
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            futures = {
+                url: executor.submit(self._refresh_channel, url)
+                for url in self._interleave_hosts(urls)
+            }
+            channels = [futures[url].result() for url in urls]
+
+        return RefreshReport(channels, time.perf_counter() - start)
+
+
+class PollScheduler:
+    """When each channel is due to be polled next, kept in a heap so a tick
+    only looks at the ones that are due.
+
+    A channel's interval adapts to how often it changes: it halves after a
+    poll with new items and grows by half after one without, between
+    `min_interval` and `max_interval` seconds and never below its ttl. A
+    failed poll is retried after an exponential backoff instead, up to
+    `max_backoff`. Every delay gets a random `jitter` (a fraction of it) so
+    the channels don't end up polled all at once, and is pushed past the
+    channel's skipHours and skipDays (GMT)."""
+
+    DAYS = (
+        "Monday",
+        "Tuesday",
+        "Wednesday",
+        "Thursday",
+        "Friday",
+        "Saturday",
+        "Sunday",
+    )
+
+    def __init__(
+        self,
+        default_interval=15 * 60,
+        min_interval=60,
+        max_interval=6 * 60 * 60,
+        max_backoff=24 * 60 * 60,
+        jitter=0.1,
+    ):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._heap = []  # (due, url), may have entries no longer in _channels
+        self._channels = {}  # url -> its state, see add()
+
+    def add(self, url, ttl=None, skip_hours=(), skip_days=(), due=None):
+        """Schedule a channel, due right away unless `due` is given. The ones
+        already scheduled get their hints updated, and are moved to `due` if
+        given."""
+        if url in self._channels:
+            channel = self._channels[url]
+            if due is not None:
+                self._push(url, due)
+        else:
+            channel = self._channels[url] = {
+                "interval": self.default_interval,
+                "failures": 0,
+                "due": None,
+            }
+            self._push(url, time.time() if due is None else due)
+
+        channel["ttl"] = ttl * 60 if ttl else 0
+        channel["skip_hours"] = set(skip_hours or ())
+        channel["skip_days"] = {
+            self.DAYS.index(day) for day in skip_days or () if day in self.DAYS
+        }
+
+    def load(self, feed):
+        """Schedule the channels of the ChannelList not scheduled yet and update
+        the hints of the others"""
+        for url, hints in feed.channel_poll_hints.items():
+            self.add(url, **hints)
+
+    def remove(self, url):
+        self._channels.pop(url, None)
+
+    def __len__(self):
+        return len(self._channels)
+
+    def _push(self, url, due):
+        self._channels[url]["due"] = due
+        heapq.heappush(self._heap, (due, url))
+
+    def _is_current(self, due, url):
+        channel = self._channels.get(url)
+        return channel is not None and channel["due"] == due
+
+    def next_due(self):
+        """When the earliest channel is due, None if there are none"""
+        while self._heap and not self._is_current(*self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """Take the channels due by `now`, earliest first. Each must be given
+        back with record() once polled to be scheduled again."""
+        now = time.time() if now is None else now
+        urls = []
+        while (due := self.next_due()) is not None and due <= now:
+            _, url = heapq.heappop(self._heap)
+            self._channels[url]["due"] = None
+            urls.append(url)
+        return urls
+
+    def record(self, url, failed=False, changed=False, now=None):
+        """Schedule the next poll of a channel after polling it"""
+        channel = self._channels.get(url)
+        if channel is None:
+            return
+
+        if failed:
+            channel["failures"] += 1
+            delay = min(
+                self.max_backoff, channel["interval"] * 2 ** channel["failures"]
+            )
+        else:
+            channel["failures"] = 0
+            factor = 0.5 if changed else 1.5
+            channel["interval"] = min(
+                self.max_interval,
+                max(self.min_interval, channel["interval"] * factor),
+            )
+            delay = channel["interval"]
+
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        # the feed asked not to be polled more often, even past max_interval
+        # and when retrying a failure
+        delay = max(delay, channel["ttl"])
+        now = time.time() if now is None else now
+        self._push(url, self._skip(channel, now + delay))
+
+    @staticmethod
+    def _skip(channel, due):
+        # to the start of the next hour until one that is not skipped, a week
+        # at most in case every one is
+        for _ in range(24 * 7):
+            date = datetime.datetime.fromtimestamp(due, datetime.timezone.utc)
+            if (
+                date.hour not in channel["skip_hours"]
+                and date.weekday() not in channel["skip_days"]
+            ):
+                break
+            due = (due // 3600 + 1) * 3600
+        return due
+
+    def tick(self, refresher, now=None):
+        """Refresh the channels that are due with a Refresher and schedule
+        them again from how it went, returning its RefreshReport"""
+        report = refresher.refresh(self.pop_due(now))
+        for channel in report:
+            self.record(
+                channel.url,
+                failed=channel.status == "failed",
+                changed=channel.new_items > 0,
+            )
+        return report
+
+
+
+def _print_report(report):
+    for channel in report:
+        line = f"{channel.status:<12} {channel.new_items:>4} new  {channel.url}"
+        if channel.error:
+            line += f"  ({channel.error})"
+        print(line)
+    print(report)
+
+
+def _refresh_command(feed, args):
+    report = Refresher(feed, workers=args.workers, timeout=args.timeout).refresh(
+        args.urls or None
+    )
+    _print_report(report)
+    return 1 if report.failed and len(report.failed) == len(report) else 0
+
+
+def _retention_policy_of(args):
+    max_age = args.max_age * 24 * 60 * 60 if args.max_age is not None else None
+    return RetentionPolicy(
+        args.max_items,
+        max_age,
+        keep_unread=not getattr(args, "prune_unread", False),
+        keep_starred=not getattr(args, "prune_starred", False),
+    )
+
+
+def _daemon_command(feed, args):
+    # stored as the policy of all channels, the ui prunes by it too
+    if args.max_items is not None or args.max_age is not None:
+        feed.set_retention_policy(_retention_policy_of(args))
+
+    # a signal only stops the loop, the refresh running is let to finish so
+    # nothing is left half written
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    scheduler = PollScheduler()
+    refresher = Refresher(feed, workers=args.workers, timeout=args.timeout)
+    reload_at = 0  # time.monotonic() of the next load
+    while not stop.is_set():
+        # channels may be added by someone else meanwhile, the ui for one.
+        # Loading reads all of them so it isn't done on every tick.
+        if time.monotonic() >= reload_at:
+            scheduler.load(feed)
+            reload_at = time.monotonic() + args.reload
+
+        report = scheduler.tick(refresher)
+        if len(report):
+            _print_report(report)
+            if report.new_items and feed.retention_policies():
+                print(f"pruned {feed.prune()} items")
+
+        # woken up at the next due channel or to look for new channels
+        wait = reload_at - time.monotonic()
+        if (due := scheduler.next_due()) is not None:
+            wait = min(wait, due - time.time())
+        stop.wait(max(wait, 0))
+    return 0
+
+
+def _stats_command(feed, args):
+    names = dict(feed.channel_id_and_title)
+    stats = feed.channel_stats()
+    for ch_id, counters in sorted(stats.items(), key=lambda item: names[item[0]]):
+        newest = counters["newest"]
+        if newest is not None:
+            newest = datetime.datetime.fromtimestamp(newest).isoformat(" ", "minutes")
+        print(
+            f"{counters['total']:>6} items {counters['unread']:>6} unread"
+            f"  newest {newest}  {names[ch_id]}"
+        )
+
+    if not feed.incremental_vacuum_enabled:
+        print("the space of pruned items is not given back, see the vacuum command")
+
+    storage = feed.content_storage_stats()
+    print(
+        f"{len(stats)} channels, {sum(c['total'] for c in stats.values())} items,"
+        f" {storage['inline_bytes'] + storage['compressed_bytes']} content bytes"
+        f" (schema version {feed.schema_version})"
+    )
+    return 0
+
+
+def _retention_command(feed, args):
+    channel_id = uuid_from_url(args.channel) if args.channel else None
+    if args.keep_all:
+        feed.set_retention_policy(None, channel_id)
+    elif args.max_items is not None or args.max_age is not None:
+        feed.set_retention_policy(_retention_policy_of(args), channel_id)
+
+    names = dict(feed.channel_id_and_title)
+    for ch_id, policy in feed.retention_policies().items():
+        name = "all channels" if ch_id is None else names.get(ch_id, ch_id)
+        max_age = policy.max_age
+        if max_age is not None:
+            max_age /= 24 * 60 * 60
+        print(
+            f"{name}: max items {policy.max_items}, max age {max_age} days,"
+            f" keep unread {policy.keep_unread}, keep starred {policy.keep_starred}"
+        )
+    return 0
+
+
+def _vacuum_command(feed, args):
+    if feed.enable_incremental_vacuum():
+        print("incremental vacuum enabled")
+    while freed := feed.incremental_vacuum():
+        print(f"freed {freed} pages")
+    return 0
+
+
+def main(argv=None):
+    """The headless entry point, `python -m syndicate refresh|daemon|stats|...`.
+    It keeps the database current without the ui, so Qt is never imported."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="syndicate", description="Keep the syndicate database current."
+    )
+    parser.add_argument("--db", default=DB_FILE, help="database file")
+    parser.add_argument("--workers", type=int, default=16, help="parallel fetches")
+    parser.add_argument(
+        "--timeout", type=float, default=10, help="seconds to wait for a server"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    refresh = commands.add_parser(
+        "refresh", help="refresh every channel once, or the ones given"
+    )
+    refresh.add_argument("urls", nargs="*", help="channels to refresh or add")
+    refresh.set_defaults(run=_refresh_command)
+
+    daemon = commands.add_parser(
+        "daemon", help="refresh the channels as they are due until terminated"
+    )
+    daemon.add_argument(
+        "--reload",
+        type=float,
+        default=60,
+        help="seconds between looks for channels added meanwhile",
+    )
+    daemon.add_argument(
+        "--max-items", type=int, help="items kept per channel, stored for all"
+    )
+    daemon.add_argument(
+        "--max-age", type=float, help="days an item is kept, stored for all"
+    )
+    daemon.set_defaults(run=_daemon_command)
+
+    retention = commands.add_parser(
+        "retention", help="show or store which items are kept when pruning"
+    )
+    retention.add_argument(
+        "--channel", help="url of the channel, else all those without their own"
+    )
+    retention.add_argument("--max-items", type=int, help="items kept per channel")
+    retention.add_argument("--max-age", type=float, help="days an item is kept")
+    retention.add_argument(
+        "--prune-unread", action="store_true", help="prune the unread items too"
+    )
+    retention.add_argument(
+        "--prune-starred", action="store_true", help="prune the starred items too"
+    )
+    retention.add_argument(
+        "--keep-all", action="store_true", help="remove the policy, keeping everything"
+    )
+    retention.set_defaults(run=_retention_command)
+
+    stats = commands.add_parser("stats", help="item counters of every channel")
+    stats.set_defaults(run=_stats_command)
+
+    vacuum = commands.add_parser(
+        "vacuum",
+        help="give the free space back, rebuilding the database once if needed",
+    )
+    vacuum.set_defaults(run=_vacuum_command)
+
+    args = parser.parse_args(argv)
+    feed = ChannelList(args.db)
+    feed.open()
+    try:
+        return args.run(feed, args)
+    finally:
+        feed.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
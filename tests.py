@@ -1,7 +1,37 @@
+import contextlib
+import gzip
+import hashlib
+import http.server
+import io
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from syndicate import ChannelList, uuid_from_url
+from syndicate import (
+    ChannelList,
+    FeedError,
+    FeedSession,
+    PollScheduler,
+    RetentionPolicy,
+    Refresher,
+    WriteQueue,
+    fetch_feed,
+    fetch_rss,
+    main,
+    parse_rss,
+    stream_feed_items,
+    uuid_from_url,
+)
 from rss.parser.tests.test_document import *
+from rss.parser.tests.test_bulk import *
+from rss.parser.tests.test_date import *
 from rss.parser.tests.test_item import *
+from xml_parser.tests.test_parser import *
 
 
 class ChannelListTest(unittest.TestCase):
@@ -18,6 +48,20 @@ class ChannelListTest(unittest.TestCase):
         test_url = "test url"
         self.feed.add_channel("test channel", test_url)
 
+    def test_open_migrates_to_the_latest_schema(self):
+        self.assertEqual(self.feed.schema_version, len(ChannelList.MIGRATIONS))
+
+        rows = self.feed.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM item WHERE channel = ? AND read = 0",
+            ("channel",),
+        )
+        plan = " ".join(row[-1] for row in rows.fetchall())
+        self.assertIn("USING INDEX item_channel_read", plan)
+
+        # already up to date, nothing runs again
+        self.feed.open()
+        self.assertEqual(self.feed.schema_version, len(ChannelList.MIGRATIONS))
+
     def test_add_channel(self):
         test_url = "test url"
         self.feed.add_channel("test channel", test_url)
@@ -68,6 +112,355 @@ class ChannelListTest(unittest.TestCase):
         items = self.feed.get_feed(ch_id)
         self.assertEqual(items[uid]["read"], True)
 
+    def test_add_items_in_bulk(self):
+        test_url = "test url"
+        ch_id = uuid_from_url(test_url)
+        self.feed.add_channel("test channel", test_url)
+        self.feed.add_feed_item("item1", "content1", "link", "1", 55555, ch_id)
+
+        notified = []
+        self.feed.subscribe(notified.append)
+        new_items = self.feed.add_feed_items(
+            [
+                ("item1", "content1", "link", "1", 55555, ch_id),
+                ("item2", "content2", "link", "2", 55556, ch_id),
+                ("item2 again", "content2", "link", "2", 55556, ch_id),
+                ("item3", "content3", "link", "3", 55557, ch_id),
+            ]
+        )
+
+        self.assertEqual([item["title"] for item in new_items], ["item2", "item3"])
+        self.assertEqual(notified, new_items)
+        self.assertEqual(len(self.feed.get_feed(ch_id)), 3)
+
+    def test_get_feed_page(self):
+        test_url = "test url"
+        ch_id = uuid_from_url(test_url)
+        self.feed.add_channel("test channel", test_url)
+        for i in range(5):
+            self.feed.add_feed_item(f"item{i}", "content", "link", str(i), i, ch_id)
+        self.feed.mark_feed_item_as(ch_id, "3", True)
+
+        first = self.feed.get_feed_page(ch_id, limit=2, columns=("title", "read"))
+        self.assertEqual(
+            first,
+            [
+                {"id": "4", "date": 4, "title": "item4", "read": False},
+                {"id": "3", "date": 3, "title": "item3", "read": True},
+            ],
+        )
+
+        last = first[-1]
+        key = (last["date"], last["id"])
+        second = self.feed.get_feed_page(ch_id, limit=2, after=key)
+        self.assertEqual([item["id"] for item in second], ["2", "1"])
+        self.assertEqual(second[0]["content"], "content")
+
+        first_again = self.feed.get_feed_page(
+            ch_id, limit=2, before=(second[0]["date"], second[0]["id"])
+        )
+        self.assertEqual([item["id"] for item in first_again], ["4", "3"])
+
+        filtered = self.feed.get_feed_page(ch_id, unread_only=True, since=1, until=4)
+        self.assertEqual([item["id"] for item in filtered], ["2", "1"])
+
+        with self.assertRaises(ValueError):
+            self.feed.get_feed_page(ch_id, columns=("title; DROP TABLE item",))
+
+    def test_search(self):
+        ch1_id = self.feed.add_channel("test channel", "test url")
+        ch2_id = self.feed.add_channel("test channel", "test url2")
+        self.feed.add_feed_item("Python news", "a release", "link", "1", 0, ch1_id)
+        self.feed.add_feed_item("Other", "all about pythons", "link", "2", 0, ch1_id)
+        self.feed.add_feed_item("Weather", "python in the rain", "link", "3", 0, ch2_id)
+
+        given = self.feed.search("python")
+        self.assertEqual([item["id"] for item in given], ["1", "3"])
+        self.assertEqual(given[0]["snippet"], "<b>Python</b> news")
+
+        given = self.feed.search("python*", channel=ch1_id, limit=1, offset=1)
+        self.assertEqual([item["id"] for item in given], ["2"])
+
+        with self.assertRaises(FeedError):
+            self.feed.search('"unbalanced')
+
+    def test_search_indexes_items_stored_before_it_existed(self):
+        feed = ChannelList(":memory:")
+        feed._create_db()
+        ch_id = feed.add_channel("test channel", "test url")
+        # as stored by the version 0 schema
+        feed.conn.execute(
+            "INSERT INTO item (id, title, content, link, date, channel) VALUES (?,?,?,?,?,?)",
+            ("1", "Old item", "content", "link", 0, ch_id),
+        )
+
+        feed.open()
+        self.assertEqual([item["id"] for item in feed.search("old")], ["1"])
+        feed.close()
+
+    def test_compressed_content(self):
+        feed = ChannelList(":memory:", compress_content=True)
+        feed.open()
+        ch1_id = feed.add_channel("test channel", "test url")
+        ch2_id = feed.add_channel("test channel", "test url2")
+        body = "<p>A python release, syndicated everywhere.</p>" * 10
+        feed.add_feed_item("item1", body, "link", "1", 0, ch1_id)
+        feed.add_feed_items([("item2", body, "link", "2", 0, ch2_id)])
+        feed.add_feed_item("item3", "short", "link", "3", 0, ch2_id)
+
+        self.assertEqual(feed.get_feed(ch1_id)["1"]["content"], body)
+        page = feed.get_feed_page(ch2_id, columns=("content",))
+        self.assertEqual([item["content"] for item in page], ["short", body])
+        self.assertEqual([item["id"] for item in feed.search("python")], ["1", "2"])
+
+        stats = feed.content_storage_stats()
+        self.assertEqual(stats["inline_items"], 1)
+        self.assertEqual(stats["compressed_items"], 2)
+        self.assertEqual(stats["contents"], 1)
+        self.assertEqual(stats["uncompressed_bytes"], len(body))
+        self.assertLess(stats["compressed_bytes"], len(body))
+        feed.close()
+
+    def test_other_clients_can_read_the_search_index(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "test.db")
+            feed = ChannelList(path)
+            feed.open()
+            ch_id = feed.add_channel("test channel", "test url")
+            feed.add_feed_item("item1", "python " * 50, "link", "1", 0, ch_id)
+            feed.close()
+
+            # without the inflate() function of this module
+            conn = sqlite3.connect(path)
+            rows = conn.execute(
+                "SELECT highlight(item_search, 1, '<', '>') FROM item_search"
+                " WHERE item_search MATCH 'python'"
+            ).fetchall()
+            self.assertEqual(rows, [("<python> " * 50,)])
+            conn.close()
+
+            # until some content is compressed
+            feed = ChannelList(path, compress_content=True)
+            feed.open()
+            self.assertEqual(feed.compress_stored_content(), 1)
+            self.assertEqual(len(feed.search("python")), 1)
+            self.assertIn("<b>python</b>", feed.search("python")[0]["snippet"])
+            feed.close()
+
+    def test_other_clients_can_write_compressed_databases(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "test.db")
+            feed = ChannelList(path, compress_content=True)
+            feed.open()
+            ch_id = feed.add_channel("test channel", "test url")
+            feed.add_feed_item("item1", "python " * 50, "link", "1", 0, ch_id)
+            feed.add_feed_item("item2", "python", "link", "2", 0, ch_id)
+            feed.close()
+
+            # without the inflate() function of this module
+            conn = sqlite3.connect(path)
+            conn.execute("DELETE FROM item WHERE id = '2'")
+            conn.execute(
+                "INSERT INTO item (id, title, content, link, date, channel)"
+                " VALUES ('3', 'item3', 'python', 'link', 0, ?)",
+                (ch_id,),
+            )
+            conn.commit()
+            conn.close()
+
+            feed = ChannelList(path, compress_content=True)
+            feed.open()
+            self.assertEqual([item["id"] for item in feed.search("python")], ["1", "3"])
+            feed.set_retention_policy(RetentionPolicy(max_items=0))
+            feed.mark_channel_as(ch_id, True)
+            self.assertEqual(feed.prune(), 2)
+            self.assertEqual(feed.search("python"), [])
+            # raises if the index is out of sync with the items
+            feed.conn.execute(
+                "INSERT INTO item_search (item_search) VALUES ('integrity-check')"
+            )
+            feed.close()
+
+    def test_get_item_content(self):
+        ch_id = self.feed.add_channel("test channel", "test url")
+        self.feed.add_feed_item("item", "the content", "link", "1", 1, ch_id)
+
+        page = self.feed.get_feed_page(ch_id, columns=("title", "read"))
+        self.assertNotIn("content", page[0])
+        self.assertEqual(self.feed.get_item_content(ch_id, "1"), "the content")
+        self.assertIsNone(self.feed.get_item_content(ch_id, "2"))
+
+    def test_compress_stored_content(self):
+        ch_id = self.feed.add_channel("test channel", "test url")
+        body = "<div>Some boilerplate around the weather news</div>" * 5
+        for i in range(5):
+            self.feed.add_feed_item(f"item{i}", body, "link", str(i), i, ch_id)
+        self.feed.add_feed_item("item5", "short", "link", "5", 5, ch_id)
+
+        self.assertEqual(self.feed.compress_stored_content(batch_size=2), 5)
+        self.assertEqual(self.feed.compress_stored_content(), 0)
+
+        stats = self.feed.content_storage_stats()
+        self.assertEqual(stats["inline_items"], 1)
+        self.assertEqual(stats["contents"], 1)
+        feed = self.feed.get_feed(ch_id)
+        self.assertEqual(feed["0"]["content"], body)
+        self.assertEqual(feed["5"]["content"], "short")
+        self.assertEqual(len(self.feed.search("weather")), 5)
+
+    def test_prune_items_without_date(self):
+        ch_id = self.feed.add_channel("test channel", "test url")
+        now = time.time()
+        self.feed.add_feed_items(
+            [
+                ("dated", "content", "link", "dated", now - 3 * 86400, ch_id),
+                ("undated", "content", "link", "undated", 0, ch_id),
+            ]
+        )
+        self.feed.mark_channel_as(ch_id, True)
+
+        # aged and ordered from when they were first seen
+        self.feed.set_retention_policy(RetentionPolicy(max_age=86400))
+        self.assertEqual(self.feed.prune(), 1)
+        self.assertEqual(list(self.feed.get_feed(ch_id)), ["undated"])
+        self.feed.add_feed_items(
+            [("older", "content", "link", "older", now - 86000, ch_id)]
+        )
+        self.feed.mark_channel_as(ch_id, True)
+        self.feed.set_retention_policy(RetentionPolicy(max_items=1))
+        self.assertEqual(self.feed.prune(), 1)
+        self.assertEqual(list(self.feed.get_feed(ch_id)), ["undated"])
+
+    def test_prune(self):
+        ch1_id = self.feed.add_channel("test channel", "test url")
+        ch2_id = self.feed.add_channel("test channel", "test url2")
+        self.feed.add_feed_items(
+            (f"item{i}", "x" * 200, "link", f"{ch}-{i}", i * 10 + 1, ch)
+            for ch in (ch1_id, ch2_id)
+            for i in range(10)
+        )
+        self.feed.mark_channel_as(ch1_id, True)
+        self.feed.mark_channel_as(ch2_id, True)
+        self.feed.mark_feed_item_as(ch1_id, f"{ch1_id}-0", False)
+        self.feed.mark_feed_item_starred(ch1_id, f"{ch1_id}-1", True)
+
+        self.feed.set_retention_policy(RetentionPolicy(max_items=3))
+        self.feed.set_retention_policy(RetentionPolicy(max_age=45), ch2_id)
+        self.assertEqual(self.feed.prune(now=100, batch_size=2), 5 + 6)
+
+        # the unread and starred ones are kept too
+        self.assertEqual(
+            sorted(self.feed.get_feed(ch1_id)),
+            sorted(f"{ch1_id}-{i}" for i in (0, 1, 7, 8, 9)),
+        )
+        self.assertEqual(
+            sorted(self.feed.get_feed(ch2_id)),
+            sorted(f"{ch2_id}-{i}" for i in (6, 7, 8, 9)),
+        )
+        self.assertEqual(self.feed.search("item2"), [])
+
+        # nothing left to prune, and the pruned ones are not stored again
+        self.assertEqual(self.feed.prune(now=100), 0)
+        new_items = self.feed.add_feed_items(
+            [("item2", "content", "link", f"{ch1_id}-2", 20, ch1_id)]
+        )
+        self.assertEqual(new_items, [])
+
+    def test_prune_deletes_unused_contents(self):
+        feed = ChannelList(":memory:", compress_content=True)
+        feed.open()
+        ch1_id = feed.add_channel("test channel", "test url")
+        ch2_id = feed.add_channel("test channel", "test url2")
+        shared, own = "shared " * 50, "own " * 50
+        feed.add_feed_item("item1", shared, "link", "1", 0, ch1_id)
+        feed.add_feed_item("item2", own, "link", "2", 0, ch1_id)
+        feed.add_feed_item("item3", shared, "link", "3", 0, ch2_id)
+        feed.mark_channel_as(ch1_id, True)
+
+        feed.set_retention_policy(RetentionPolicy(max_items=0), ch1_id)
+        self.assertEqual(feed.prune(), 2)
+        self.assertEqual(feed.content_storage_stats()["contents"], 1)
+        self.assertEqual(feed.get_feed(ch2_id)["3"]["content"], shared)
+        feed.close()
+
+    def assertChannelStatsConsistent(self):
+        counted = {}
+        for ch_id, _ in self.feed.channel_id_and_title:
+            items = self.feed.get_feed(ch_id).values()
+            counted[ch_id] = {
+                "total": len(items),
+                "unread": sum(not item["read"] for item in items),
+                "newest": max((item["date"] for item in items), default=None),
+            }
+        self.assertEqual(self.feed.channel_stats(), counted)
+
+    def test_channel_stats(self):
+        ch1_id = self.feed.add_channel("test channel", "test url")
+        ch2_id = self.feed.add_channel("test channel", "test url2")
+        ch3_id = self.feed.add_channel("test channel", "test url3")
+        self.feed.add_feed_items(
+            (f"item{i}", "content", "link", f"{ch}-{i}", i, ch)
+            for ch in (ch1_id, ch2_id)
+            for i in range(10)
+        )
+        self.feed.add_feed_item("item", "content", "link", "single", 20, ch1_id)
+        self.assertEqual(
+            self.feed.channel_stats()[ch1_id], {"total": 11, "unread": 11, "newest": 20}
+        )
+        self.assertEqual(
+            self.feed.channel_stats()[ch3_id], {"total": 0, "unread": 0, "newest": None}
+        )
+
+        self.feed.mark_feed_items_as(ch1_id, [f"{ch1_id}-{i}" for i in range(5)], True)
+        self.feed.mark_channel_as(ch2_id, True)
+        self.feed.mark_feed_item_as(ch2_id, f"{ch2_id}-9", False)
+        self.assertChannelStatsConsistent()
+
+        self.feed.set_retention_policy(RetentionPolicy(max_items=4, keep_unread=False))
+        self.feed.prune()
+        self.assertEqual(
+            self.feed.channel_stats()[ch2_id], {"total": 4, "unread": 1, "newest": 9}
+        )
+        self.feed.set_retention_policy(RetentionPolicy(max_items=0, keep_unread=False))
+        self.feed.prune()
+        self.assertChannelStatsConsistent()
+
+        self.feed.conn.execute("DELETE FROM channel_stats")
+        self.feed.rebuild_channel_stats()
+        self.assertChannelStatsConsistent()
+
+    def test_mark_item_as_read_of_another_channel(self):
+        ch1_id = self.feed.add_channel("test channel", "test url")
+        ch2_id = self.feed.add_channel("test channel", "test url2")
+        self.feed.add_feed_item("item1", "content1", "link", "1", 0, ch1_id)
+
+        with self.assertRaises(FeedError):
+            self.feed.mark_feed_item_as(ch2_id, "1", True)
+
+    def test_mark_many_items_as_read(self):
+        ch1_id = self.feed.add_channel("test channel", "test url")
+        ch2_id = self.feed.add_channel("test channel", "test url2")
+        for i in range(6):
+            self.feed.add_feed_item(f"item{i}", "", "", str(i), i, ch1_id)
+        self.feed.add_feed_item("item6", "", "", "6", 0, ch2_id)
+
+        def unread(channel_id):
+            items = self.feed.get_feed(channel_id).values()
+            return sorted(item["id"] for item in items if not item["read"])
+
+        self.assertEqual(self.feed.mark_feed_items_as(ch1_id, ["0", "1", "6"], True), 2)
+        self.assertEqual(self.feed.mark_feed_items_as(ch1_id, ["0"], True), 0)
+        self.assertEqual(unread(ch1_id), ["2", "3", "4", "5"])
+
+        self.assertEqual(self.feed.mark_older_than(4, channel_id=ch1_id), 2)
+        self.assertEqual(unread(ch1_id), ["4", "5"])
+        self.assertEqual(unread(ch2_id), ["6"])
+
+        self.assertEqual(self.feed.mark_channel_as(ch1_id, True), 2)
+        self.assertEqual(unread(ch1_id), [])
+        self.assertEqual(self.feed.mark_older_than(1), 1)
+        self.assertEqual(unread(ch2_id), [])
+
     def test_subscribe(self):
         test_url = "test url"
         ch_id = uuid_from_url(test_url)
@@ -102,6 +495,771 @@ class ChannelListTest(unittest.TestCase):
         self.assertEqual(ch1_items[ch1_item2_id]["id"], ch1_item2_id)
         self.assertEqual(ch2_items[ch2_item1_id]["id"], ch2_item1_id)
 
+    def test_parse_rss_refresh_adds_only_new_items(self):
+        url = "test url"
+        item = """
+            <item>
+                <title>{0}</title>
+                <link>http://test.test/{0}</link>
+                <description>content of {0}</description>
+            </item>
+        """
+        content = """
+            <rss version="2.0">
+                <channel>
+                    <title>Channel Title</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    {}
+                </channel>
+            </rss>
+        """
+        parse_rss(self.feed, content.format(item.format("a")), url)
+
+        new_items = []
+        self.feed.subscribe(new_items.append)
+        parse_rss(self.feed, content.format(item.format("b") + item.format("a")), url)
+
+        self.assertEqual([item["title"] for item in new_items], ["b"])
+        self.assertEqual(new_items[0]["content"], "content of b")
+        self.assertEqual(len(self.feed.get_feed(uuid_from_url(url))), 2)
+
+    def test_parse_rss_refresh_updates_the_poll_hints(self):
+        url = "test url"
+        hints = "<ttl>60</ttl><skipDays><day>Sunday</day></skipDays>"
+        parse_rss(self.feed, FEED_DOCUMENT.format(""), url)
+        self.assertEqual(self.feed.channel_poll_hints[url]["ttl"], None)
+
+        parse_rss(self.feed, FEED_DOCUMENT.format(hints + FEED_ITEM.format("a")), url)
+        self.assertEqual(
+            self.feed.channel_poll_hints[url],
+            {"ttl": 60, "skip_hours": [], "skip_days": ["Sunday"]},
+        )
+
+        # and dropped once the feed drops them
+        parse_rss(self.feed, FEED_DOCUMENT.format(FEED_ITEM.format("a")), url)
+        self.assertEqual(
+            self.feed.channel_poll_hints[url],
+            {"ttl": None, "skip_hours": [], "skip_days": []},
+        )
+
+    def test_parse_rss_skips_unchanged_documents(self):
+        url = "test url"
+        content = """
+            <rss version="2.0">
+                <channel>
+                    <title>Channel Title</title>
+                    <link>https://test.test</link>
+                    <description>Sample description</description>
+                    <item>
+                        <title>Item Title</title>
+                        <link>http://test.test</link>
+                        <description>description</description>
+                    </item>
+                </channel>
+            </rss>
+        """
+        parse_rss(self.feed, content, url)
+        parse_rss(self.feed, content.encode("utf-8"), url)
+        parse_rss(self.feed, content.replace("Item Title", "Changed"), url)
+
+        self.assertEqual(self.feed.parse_cache.hits, 1)
+        self.assertEqual(self.feed.parse_cache.misses, 2)
+        self.assertEqual(self.feed.parse_cache.skipped_bytes, len(content))
+
+
+FEED_DOCUMENT = """
+    <rss version="2.0">
+        <channel>
+            <title>Channel Title</title>
+            <link>https://test.test</link>
+            <description>Sample description</description>
+            {}
+        </channel>
+    </rss>
+"""
+
+FEED_ITEM = """
+    <item>
+        <title>{0}</title>
+        <link>http://test.test/{0}</link>
+        <description>content of {0}</description>
+    </item>
+"""
+
+
+class FeedRequestHandler(http.server.BaseHTTPRequestHandler):
+    # keeps the connections alive
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delay)
+            self._send_document()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _send_document(self):
+        document = self.server.documents.get(self.path)
+        if document is None:
+            self.send_error(404)
+            return
+
+        etag = '"' + hashlib.md5(document).hexdigest() + '"'
+        last_modified = self.server.last_modified[self.path]
+        # If-None-Match takes precedence when both are sent
+        if self.server.etags and "If-None-Match" in self.headers:
+            not_modified = self.headers["If-None-Match"] == etag
+        else:
+            not_modified = self.headers.get("If-Modified-Since") == last_modified
+        if not_modified:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        accepted = self.headers.get("Accept-Encoding", "")
+        if self.server.compress and "gzip" in accepted:
+            document = gzip.compress(document)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(document)))
+        if self.server.etags:
+            self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+
+        if not self.server.trickle:
+            self.wfile.write(document)
+            return
+        for start in range(0, len(document), 1024):
+            self.wfile.write(document[start : start + 1024])
+            self.wfile.flush()
+            time.sleep(self.server.trickle)
+
+    def log_message(self, *args):
+        pass
+
+
+class FeedServer(http.server.ThreadingHTTPServer):
+    """A local stand-in for the feeds' servers"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FeedRequestHandler)
+        self.documents = {}
+        self.last_modified = {}
+        self.requests = []
+        self.etags = True
+        self.compress = False
+        self.delay = 0  # seconds before answering each request
+        self.trickle = 0  # seconds between each KiB of the documents
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0  # requests answered at the same time
+
+    def publish(self, path, titles, last_modified="Mon, 05 Oct 2026 10:00:00 GMT"):
+        items = "".join(FEED_ITEM.format(title) for title in titles)
+        self.documents[path] = FEED_DOCUMENT.format(items).encode("utf-8")
+        self.last_modified[path] = last_modified
+        return self.url(path)
+
+    def handle_error(self, request, client_address):
+        # the capped downloads drop the connection halfway
+        pass
+
+    def url(self, path, host="127.0.0.1"):
+        return f"http://{host}:{self.server_address[1]}{path}"
+
+    def __enter__(self):
+        threading.Thread(
+            target=self.serve_forever, args=(0.01,), daemon=True
+        ).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class FetchFeedTest(unittest.TestCase):
+    def setUp(self):
+        self.feed = ChannelList(":memory:")
+        self.feed.open()
+        self.server = FeedServer().__enter__()
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.feed.close()
+
+    def test_unchanged_document_is_not_downloaded_again(self):
+        url = self.server.publish("/feed", ["a"])
+        response = fetch_feed(self.feed, url)
+        parse_rss(self.feed, response, url)
+        self.assertEqual(response.status, 200)
+
+        validators = self.feed.http_validators(uuid_from_url(url))
+        self.assertEqual(validators["etag"], response.etag)
+        self.assertEqual(validators["last_modified"], "Mon, 05 Oct 2026 10:00:00 GMT")
+        self.assertEqual(validators["content_length"], len(response.content))
+
+        response = fetch_feed(self.feed, url)
+        parse_rss(self.feed, response, url)
+        self.assertTrue(response.not_modified)
+        self.assertIsNone(response.content)
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers["If-None-Match"], validators["etag"])
+        # not even hashed
+        self.assertEqual(self.feed.parse_cache.misses, 1)
+        self.assertEqual(self.feed.parse_cache.hits, 0)
+
+        self.server.publish("/feed", ["b", "a"])
+        response = fetch_feed(self.feed, url)
+        parse_rss(self.feed, response, url)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.feed.get_feed(uuid_from_url(url))), 2)
+        self.assertNotEqual(
+            self.feed.http_validators(uuid_from_url(url))["etag"], validators["etag"]
+        )
+
+    def test_last_modified_without_etag(self):
+        self.server.etags = False
+        url = self.server.publish("/feed", ["a"])
+        parse_rss(self.feed, fetch_feed(self.feed, url), url)
+        self.assertIsNone(self.feed.http_validators(uuid_from_url(url))["etag"])
+
+        response = fetch_feed(self.feed, url)
+        self.assertTrue(response.not_modified)
+        headers = self.server.requests[-1][1]
+        self.assertNotIn("If-None-Match", headers)
+        self.assertEqual(headers["If-Modified-Since"], "Mon, 05 Oct 2026 10:00:00 GMT")
+
+    def test_session_reuses_connections(self):
+        session = FeedSession()
+        urls = [self.server.publish(f"/feed{i}", [str(i)]) for i in range(3)]
+        urls.append(self.server.url("/feed0", host="localhost"))
+        for url in urls:
+            parse_rss(self.feed, fetch_feed(self.feed, url, session=session), url)
+        fetch_feed(self.feed, urls[0], session=session)
+
+        self.assertEqual(
+            session.connection_stats(),
+            {
+                "127.0.0.1": {"connections": 1, "requests": 4, "reused": 3},
+                "localhost": {"connections": 1, "requests": 1, "reused": 0},
+            },
+        )
+        session.close()
+
+    def test_session_counts_the_hosts_it_dropped(self):
+        session = FeedSession(pool_connections=1)
+        self.server.publish("/feed", ["a"])
+        for host in ("127.0.0.1", "localhost", "127.0.0.1"):
+            fetch_feed(self.feed, self.server.url("/feed", host), session=session)
+
+        stats = session.connection_stats()
+        self.assertEqual(
+            stats["127.0.0.1"], {"connections": 2, "requests": 2, "reused": 0}
+        )
+        self.assertEqual(stats["localhost"]["requests"], 1)
+        session.close()
+
+    def test_compressed_transfer(self):
+        self.server.compress = True
+        url = self.server.publish("/feed", ["a"])
+        response = fetch_feed(self.feed, url, session=FeedSession())
+
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers["Accept-Encoding"], "gzip, deflate")
+        self.assertEqual(response.content, self.server.documents["/feed"])
+        parse_rss(self.feed, response, url)
+        self.assertEqual(len(self.feed.get_feed(uuid_from_url(url))), 1)
+
+    def test_stream_items_before_the_download_ends(self):
+        self.server.trickle = 0.005
+        url = self.server.publish("/feed", [str(i) for i in range(200)])
+
+        sending = []
+        titles = []
+        for item in stream_feed_items(url, chunk_size=1024):
+            sending.append(self.server.active)
+            titles.append(item.title)
+
+        self.assertEqual(titles, [str(i) for i in range(200)])
+        # the first ones came while the server was still sending the rest
+        self.assertEqual(sending[0], 1)
+
+    def test_stream_size_cap(self):
+        url = self.server.publish("/feed", [str(i) for i in range(200)])
+        with self.assertRaises(FeedError):
+            next(stream_feed_items(url, max_size=1000))
+        with self.assertRaises(FeedError):
+            fetch_feed(self.feed, url, max_size=1000)
+        with self.assertRaises(FeedError):
+            fetch_rss(url, max_size=1000)
+        self.assertEqual(fetch_rss(url), self.server.documents["/feed"])
+
+        # the size announced is the compressed one, the cap is on the decoded
+        self.server.compress = True
+        size = len(self.server.documents["/feed"])
+        titles = []
+        with self.assertRaises(FeedError):
+            for item in stream_feed_items(url, max_size=size // 2, chunk_size=1024):
+                titles.append(item.title)
+        self.assertLess(len(titles), 200)
+
+    def test_stream_deadline(self):
+        self.server.trickle = 0.05
+        url = self.server.publish("/feed", [str(i) for i in range(200)])
+        with self.assertRaises(FeedError):
+            list(stream_feed_items(url, deadline=0.2, chunk_size=1024))
+
+        # far less than a whole chunk each time, but within the socket timeout
+        self.server.trickle = 0.1
+        start = time.monotonic()
+        with self.assertRaises(FeedError):
+            fetch_rss(url, deadline=0.3)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_validators_are_only_stored_with_the_items(self):
+        url = self.server.publish("/feed", ["a"])
+        self.server.documents["/feed"] = b"<rss><channel></channel></rss>"
+
+        with self.assertRaises(ValueError):
+            parse_rss(self.feed, fetch_feed(self.feed, url), url)
+        # so the next poll gets the whole document again
+        self.assertFalse(fetch_feed(self.feed, url).not_modified)
+
+
+class RefresherTest(unittest.TestCase):
+    def setUp(self):
+        self.feed = ChannelList(":memory:")
+        self.feed.open()
+        self.server = FeedServer().__enter__()
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.feed.close()
+
+    def test_refresh_all_channels(self):
+        urls = [self.server.publish(f"/feed{i}", [f"{i}a"]) for i in range(4)]
+        for url in urls[:3]:
+            parse_rss(self.feed, fetch_feed(self.feed, url), url)
+        self.server.publish("/feed1", ["1b", "1a"])
+        del self.server.documents["/feed2"]
+
+        report = Refresher(self.feed).refresh(self.feed.channel_links + urls[3:])
+
+        self.assertEqual(
+            [(channel.url, channel.status, channel.new_items) for channel in report],
+            [
+                (urls[0], "not_modified", 0),
+                (urls[1], "updated", 1),
+                (urls[2], "failed", 0),
+                (urls[3], "updated", 1),
+            ],
+        )
+        self.assertEqual(report.new_items, 2)
+        self.assertEqual(report.failed, [report.channels[2]])
+        self.assertIsNotNone(report.channels[2].error)
+        self.assertTrue(self.feed.channel_exists(uuid_from_url(urls[3])))
+
+    def test_fetch_concurrently_with_per_host_limit(self):
+        self.server.delay = 0.2
+        urls = [self.server.publish(f"/feed{i}", [str(i)]) for i in range(4)]
+        urls += [self.server.url(f"/feed{i}", host="localhost") for i in range(4)]
+
+        report = Refresher(self.feed, workers=8, per_host=2).refresh(urls)
+
+        self.assertEqual([channel.status for channel in report], ["updated"] * 8)
+        # two hosts, two requests to each at a time
+        self.assertEqual(self.server.max_active, 4)
+        self.assertLess(report.elapsed, 8 * 0.2 / 2)
+
+
+class CommandLineTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.folder.name, "syndicate.db")
+        self.server = FeedServer().__enter__()
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.folder.cleanup()
+
+    def run_main(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = main(["--db", self.db, *argv])
+        return code, out.getvalue()
+
+    def test_refresh_and_stats(self):
+        url = self.server.publish("/feed", ["a", "b"])
+
+        code, out = self.run_main("refresh", url)
+        self.assertEqual(code, 0)
+        self.assertIn(f"updated         2 new  {url}", out)
+
+        self.server.publish("/feed", ["c", "a", "b"])
+        code, out = self.run_main("refresh")
+        self.assertEqual(code, 0)
+        self.assertIn("1 new items, 0 failed", out)
+
+        code, out = self.run_main("stats")
+        self.assertEqual(code, 0)
+        self.assertIn("3 items      3 unread", out)
+        self.assertIn("1 channels, 3 items", out)
+
+    def test_retention_is_stored(self):
+        url = self.server.publish("/feed", ["a", "b", "c"])
+        self.run_main("refresh", url)
+
+        self.run_main("retention", "--max-items", "5")
+        code, out = self.run_main(
+            "retention", "--channel", url, "--max-items", "1", "--prune-unread"
+        )
+        self.assertEqual(code, 0)
+        self.assertIn("all channels: max items 5, max age None days", out)
+        self.assertIn("Channel Title: max items 1, max age None days", out)
+
+        feed = ChannelList(self.db)
+        feed.open()
+        try:
+            self.assertEqual(feed.prune(), 2)
+        finally:
+            feed.close()
+
+        code, out = self.run_main("retention", "--channel", url, "--keep-all")
+        self.assertNotIn("Channel Title", out)
+        self.assertIn("all channels", out)
+
+    def test_daemon_stops_on_sigterm_without_qt(self):
+        url = self.server.publish("/feed", ["a"])
+        self.run_main("refresh", url)
+        self.server.publish("/feed", ["b", "a"])
+
+        # the channel is due right away
+        code = (
+            "import sys, syndicate; syndicate.main(); "
+            "print(sorted({'PyQt5', 'bs4'} & set(sys.modules)))"
+        )
+        argv = ["--db", self.db, "daemon", "--max-items", "1"]
+        daemon = subprocess.Popen(
+            [sys.executable, "-uc", code, *argv],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            # until the first tick is done
+            out = ""
+            for line in daemon.stdout:
+                out += line
+                if line.startswith("pruned"):
+                    break
+            daemon.send_signal(signal.SIGTERM)
+            out += daemon.communicate(timeout=10)[0]
+        finally:
+            daemon.kill()
+
+        self.assertEqual(daemon.returncode, 0)
+        self.assertIn("1 new items", out)
+        self.assertTrue(out.endswith("[]\n"))
+
+
+class PollSchedulerTest(unittest.TestCase):
+    # Monday 2026-10-05 00:00 GMT
+    MONDAY = 1791158400
+
+    def setUp(self):
+        self.scheduler = PollScheduler(
+            default_interval=600, min_interval=60, max_interval=3600, jitter=0
+        )
+
+    def test_pop_due_in_order(self):
+        self.scheduler.add("a", due=30)
+        self.scheduler.add("b", due=10)
+        self.scheduler.add("c", due=100)
+        self.scheduler.add("d", due=20)
+        self.scheduler.remove("d")
+
+        self.assertEqual(self.scheduler.next_due(), 10)
+        self.assertEqual(self.scheduler.pop_due(now=50), ["b", "a"])
+        self.assertEqual(self.scheduler.pop_due(now=50), [])
+        self.assertEqual(self.scheduler.next_due(), 100)
+
+    def test_interval_adapts_to_changes(self):
+        self.scheduler.add("a", due=0)
+        self.scheduler.pop_due(now=0)
+
+        self.scheduler.record("a", changed=True, now=0)
+        self.assertEqual(self.scheduler.next_due(), 300)
+        self.scheduler.pop_due(now=300)
+        self.scheduler.record("a", changed=False, now=300)
+        self.assertEqual(self.scheduler.next_due(), 300 + 450)
+
+        for _ in range(20):
+            now = self.scheduler.next_due()
+            self.scheduler.pop_due(now=now)
+            self.scheduler.record("a", changed=True, now=now)
+        self.assertEqual(self.scheduler.next_due() - now, 60)
+
+    def test_ttl_is_the_shortest_interval(self):
+        self.scheduler.add("a", ttl=30, due=0)
+        self.scheduler.pop_due(now=0)
+        self.scheduler.record("a", changed=True, now=0)
+        self.assertEqual(self.scheduler.next_due(), 30 * 60)
+
+        # longer than max_interval, after a failure too
+        self.scheduler.add("b", ttl=24 * 60, due=0)
+        self.scheduler.remove("a")
+        for failed in (False, True):
+            self.scheduler.pop_due(now=0)
+            self.scheduler.record("b", failed=failed, now=0)
+            self.assertEqual(self.scheduler.next_due(), 24 * 60 * 60)
+
+    def test_exponential_backoff_on_failure(self):
+        self.scheduler.add("a", due=0)
+        delays = []
+        now = 0
+        for failed in (True, True, True, False):
+            self.scheduler.pop_due(now=now)
+            self.scheduler.record("a", failed=failed, now=now)
+            delays.append(self.scheduler.next_due() - now)
+            now = self.scheduler.next_due()
+
+        self.assertEqual(delays, [1200, 2400, 4800, 900])
+
+    def test_jitter(self):
+        scheduler = PollScheduler(default_interval=1000, jitter=0.1)
+        for url in "abcdefgh":
+            scheduler.add(url, due=0)
+        for url in scheduler.pop_due(now=0):
+            scheduler.record(url, now=0)
+
+        # an interval of 1500 seconds, give or take 10%
+        dues = [scheduler._channels[url]["due"] for url in "abcdefgh"]
+        self.assertTrue(all(1350 <= due <= 1650 for due in dues))
+        self.assertGreater(len(set(dues)), 1)
+
+    def test_skip_hours_and_days(self):
+        self.scheduler.add("a", skip_hours=[0, 1], due=self.MONDAY)
+        self.scheduler.pop_due(now=self.MONDAY)
+        self.scheduler.record("a", now=self.MONDAY)
+        self.assertEqual(self.scheduler.next_due(), self.MONDAY + 2 * 3600)
+        self.scheduler.remove("a")
+
+        self.scheduler.add("b", skip_days=["Monday", "Tuesday"], due=self.MONDAY)
+        self.scheduler.pop_due(now=self.MONDAY)
+        self.scheduler.record("b", now=self.MONDAY)
+        self.assertEqual(self.scheduler.pop_due(now=self.MONDAY + 2 * 86400 - 1), [])
+        self.assertEqual(self.scheduler.next_due(), self.MONDAY + 2 * 86400)
+
+    def test_tick_refreshes_only_the_due_channels(self):
+        feed = ChannelList(":memory:")
+        feed.open()
+        with FeedServer() as server:
+            urls = [server.publish(f"/feed{i}", ["a"]) for i in range(3)]
+            for url in urls:
+                parse_rss(feed, fetch_feed(feed, url), url)
+            feed.set_poll_hints(uuid_from_url(urls[2]), 120, None, None)
+
+            self.scheduler.load(feed)
+            self.scheduler.add(urls[1], due=time.time() + 3600)
+            self.assertEqual(self.scheduler._channels[urls[2]]["ttl"], 120 * 60)
+
+            server.requests.clear()
+            report = self.scheduler.tick(Refresher(feed))
+
+        self.assertEqual([channel.url for channel in report], [urls[0], urls[2]])
+        self.assertEqual(len(server.requests), 2)
+        self.assertGreater(self.scheduler.next_due(), time.time() + 60)
+        feed.close()
+
+
+class WriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.feed = ChannelList(":memory:")
+        self.feed.open()
+        self.ch_id = self.feed.add_channel("test channel", "test url")
+
+    def tearDown(self):
+        self.feed.close()
+
+    def test_writes_are_committed_together(self):
+        notified = []
+        self.feed.subscribe(notified.append)
+
+        with WriteQueue(self.feed, max_batch=50, max_delay=5) as writes:
+            futures = [
+                writes.submit(
+                    self.feed.add_feed_item, f"item{i}", "", "", str(i), i, self.ch_id
+                )
+                for i in range(50)
+            ]
+            failed = writes.submit(self.feed.mark_feed_item_as, self.ch_id, "x", True)
+            marked = writes.submit(self.feed.mark_channel_as, self.ch_id, True)
+            self.assertEqual(futures[3].result(timeout=5)["title"], "item3")
+
+        # closing doesn't wait for max_delay
+        self.assertEqual(marked.result(timeout=0), 50)
+        with self.assertRaises(FeedError):
+            failed.result(timeout=0)
+
+        # the first 50 in one commit, the last two in another
+        self.assertEqual(writes.commits, 2)
+        self.assertEqual(len(notified), 50)
+        self.assertEqual(self.feed.channel_stats()[self.ch_id]["unread"], 0)
+
+        with self.assertRaises(RuntimeError):
+            writes.submit(self.feed.mark_channel_as, self.ch_id, False)
+
+    def test_items_are_notified_once_committed(self):
+        committed = []
+        self.feed.subscribe(
+            lambda item: committed.append(
+                self.feed._feed_exists(item["id"], self.ch_id)
+            )
+        )
+
+        with WriteQueue(self.feed) as writes:
+            writes.submit(self.feed.add_feed_item, "item1", "", "", "1", 0, self.ch_id)
+            writes.submit(
+                self.feed.add_feed_items, [("item2", "", "", "2", 0, self.ch_id)]
+            )
+
+        self.assertEqual(committed, [True, True])
+
+    def test_failed_write_is_not_notified(self):
+        notified = []
+        self.feed.subscribe(notified.append)
+
+        def add_and_fail():
+            self.feed.add_feed_item("item1", "", "", "1", 0, self.ch_id)
+            raise FeedError("failed")
+
+        with WriteQueue(self.feed) as writes:
+            failed = writes.submit(add_and_fail)
+            added = writes.submit(
+                self.feed.add_feed_item, "item2", "", "", "2", 0, self.ch_id
+            )
+
+        self.assertRaises(FeedError, failed.result)
+        self.assertEqual(added.result()["id"], "2")
+        self.assertEqual([item["id"] for item in notified], ["2"])
+        self.assertEqual(list(self.feed.get_feed(self.ch_id)), ["2"])
+
+
+class ChannelListConcurrencyTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.feed = ChannelList(os.path.join(self.folder.name, "test.db"))
+        self.feed.open()
+
+    def tearDown(self):
+        self.feed.close()
+        self.folder.cleanup()
+
+    def test_reads_do_not_wait_for_a_write_transaction(self):
+        ch_id = self.feed.add_channel("test channel", "test url")
+        self.feed.add_feed_item("item1", "content1", "link", "1", 0, ch_id)
+
+        writing = threading.Event()
+        read_done = threading.Event()
+
+        def long_write():
+            with self.feed._write():
+                self.feed.add_feed_item("item2", "content2", "link", "2", 0, ch_id)
+                writing.set()
+                read_done.wait(5)
+
+        writer = threading.Thread(target=long_write)
+        writer.start()
+        writing.wait(5)
+
+        # from another thread, while the write is still open
+        items = self.feed.get_feed(ch_id)
+        read_done.set()
+        writer.join()
+
+        self.assertEqual(list(items), ["1"])
+        self.assertEqual(len(self.feed.get_feed(ch_id)), 2)
+
+    def test_incremental_vacuum(self):
+        feed = self.feed
+        self.assertEqual(feed.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+
+        ch_id = feed.add_channel("test channel", "test url")
+        feed.add_feed_items(
+            ("item", "content " * 500, "link", str(i), i, ch_id) for i in range(200)
+        )
+        feed.mark_channel_as(ch_id, True)
+        feed.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size = os.path.getsize(feed.db_file)
+
+        feed.set_retention_policy(RetentionPolicy(max_items=0))
+        self.assertEqual(feed.prune(vacuum=False), 200)
+        self.assertGreater(feed.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        while feed.incremental_vacuum(pages=10):
+            pass
+        self.assertEqual(feed.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        feed.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.assertLess(os.path.getsize(feed.db_file), size)
+
+    def test_enable_incremental_vacuum_on_old_databases(self):
+        feed = ChannelList(os.path.join(self.folder.name, "old.db"))
+        feed._create_db()
+        ch_id = feed.add_channel("test channel", "test url")
+        feed.conn.execute(
+            "INSERT INTO item (id, title, content, link, date, channel) VALUES (?,?,?,?,?,?)",
+            ("1", "Old item", "content", "link", 0, ch_id),
+        )
+        self.assertEqual(feed.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 0)
+
+        # not on open, it blocks for long on a big database
+        feed.open()
+        self.assertFalse(feed.incremental_vacuum_enabled)
+
+        self.assertTrue(feed.enable_incremental_vacuum())
+        self.assertFalse(feed.enable_incremental_vacuum())
+        self.assertEqual(feed.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.assertEqual([item["id"] for item in feed.search("old")], ["1"])
+        feed.close()
+
+    def test_parse_cache_outlives_the_process(self):
+        url = "test url"
+        content = FEED_DOCUMENT.format(FEED_ITEM.format("a"))
+        parse_rss(self.feed, content, url)
+        self.feed.close()
+
+        self.feed = ChannelList(self.feed.db_file)
+        self.feed.open()
+        parse_rss(self.feed, content, url)
+        self.assertEqual(self.feed.parse_cache.stats["hits"], 1)
+
+    def test_write_from_many_threads(self):
+        ch_id = self.feed.add_channel("test channel", "test url")
+
+        def add_items(thread):
+            for i in range(20):
+                item_id = f"{thread}-{i}"
+                self.feed.add_feed_item(item_id, "", "", item_id, 0, ch_id)
+                self.feed.get_feed(ch_id)
+
+        threads = [threading.Thread(target=add_items, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.feed.get_feed(ch_id)), 80)
+        journal_mode = self.feed.conn.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual(journal_mode[0], "wal")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -26,7 +26,7 @@ class NewFeedDialog(Qt.QDialog):
         super().show()
 
     def _ok_clicked(self):
-        if self.xml_text != "":
+        if self.xml_text:
             url = self.edit_url.text()
             title = self.edit_title.text().strip()
             # FIXME: this is threadblocking and the
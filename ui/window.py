@@ -1,22 +1,44 @@
 import os
+import threading
+import time
 from PyQt5 import Qt, QtCore, QtGui, QtWidgets, uic
 from ui.new_feed_dialog import NewFeedDialog
 from ui.system_tray import SystemTray
-from syndicate import fetch_rss, parse_rss
+from syndicate import ChannelList, PollScheduler, Refresher
 
 
 class Window(Qt.QMainWindow):
-    def __init__(self, feed, *args, **kwargs):
+    # the items are added on the refresher's threads, the signal gets them to
+    # the gui one since qt widgets can only be used from there
+    new_item_added = QtCore.pyqtSignal(dict)
+
+    # the list is read a page at a time as it is scrolled, without the
+    # contents, and only the clicked item's content is read
+    PAGE_SIZE = 50
+    LIST_COLUMNS = tuple(c for c in ChannelList.ITEM_COLUMNS if c != "content")
+
+    def __init__(self, feed, writes, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.feed = feed
+        # a WriteQueue, so the clicks don't wait for the database
+        self.writes = writes
+        self.refresher = Refresher(feed)
+        self.scheduler = PollScheduler()
+        # when the scheduler last loaded the channels, None to load them on
+        # the next tick
+        self._scheduler_loaded = None
+        self._refresh_thread = None
         self.list_item_metadata = []  # [{}, ...]
+        self._list_channel_id = None  # the channel listed
+        self._list_complete = True  # whether its last page is loaded
         self.channel_list_metadata = []  # [(id, title), ...]
         self._show_notifications = True
         self._prev_rect = None
         self._initialize_component()
         self._load_channel()
 
-        feed.subscribe(lambda item: self._on_new_item_added(item))
+        self.new_item_added.connect(self._on_new_item_added)
+        feed.subscribe(self.new_item_added.emit)
         self.timer.start(10000 * 2)
 
     def _initialize_component(self):
@@ -34,37 +56,67 @@ class Window(Qt.QMainWindow):
         self.tray.open_action.triggered.connect(self.show)
         self.tray.exit_action.triggered.connect(self.close)
         self.timer = QtCore.QTimer(self)
-        # self.timer.timeout.connect(self._look_for_updates)
+        # each tick only polls the channels the scheduler says are due
+        self.timer.timeout.connect(self._look_for_updates)
 
         # TODO: if i'm really going to deal with multiple tabs then i need to create those list items
         # dynamically and keep track witch is the current one
         self.list_item.itemSelectionChanged.connect(self._item_selected)
+        self.list_item.verticalScrollBar().valueChanged.connect(self._list_scrolled)
 
     def _load_channel(self):
         self.tree_view_channels.clear()
         self.channel_list_metadata = [
             (id, title) for id, title in self.feed.channel_id_and_title
         ]
-        for _, title in self.channel_list_metadata:
-            self._add_channel(title)
+        stats = self.feed.channel_stats()
+        for id, title in self.channel_list_metadata:
+            unread = stats[id]["unread"]
+            self._add_channel(f"{title} ({unread})" if unread else title)
 
         if len(self.channel_list_metadata) != 0:
             first_channel_id = self.channel_list_metadata[0][0]
             self._load_feed(first_channel_id)
 
             if len(self.list_item_metadata) != 0:
-                self._set_content(self.list_item_metadata[0]["content"])
+                first_item = self.list_item_metadata[0]
+                self._set_content(
+                    self.feed.get_item_content(first_item["channel"], first_item["id"])
+                )
 
     def _load_feed(self, channel_id):
         # TODO: pass which tab, so it now were should load
         # when we add multiple tabs support
         self.list_item.clear()
-        self.list_item_metadata = [
-            item for _, item in self.feed.get_feed(channel_id).items()
-        ]
-        for item in self.list_item_metadata:
+        self.list_item_metadata = []
+        self._list_channel_id = channel_id
+        self._list_complete = False
+        self._load_next_page()
+
+    def _load_next_page(self):
+        after = None
+        if self.list_item_metadata:
+            last_item = self.list_item_metadata[-1]
+            after = (last_item["date"], last_item["id"])
+        page = self.feed.get_feed_page(
+            self._list_channel_id,
+            limit=self.PAGE_SIZE,
+            after=after,
+            columns=self.LIST_COLUMNS,
+        )
+        self._list_complete = len(page) < self.PAGE_SIZE
+
+        self.list_item_metadata.extend(page)
+        for item in page:
             self._add_list_item(item["title"], not item["read"])
 
+    def _list_scrolled(self, value):
+        # the next page once the end of the list is near
+        scroll_bar = self.list_item.verticalScrollBar()
+        near_end = value >= scroll_bar.maximum() - scroll_bar.pageStep()
+        if near_end and not self._list_complete:
+            self._load_next_page()
+
     def _on_new_item_added(self, item):
         # NOTE: not wise to call _load_feed yet since
         # this method will be called when adding a new
@@ -92,7 +144,10 @@ class Window(Qt.QMainWindow):
 
     def _set_item_status(self, item, metaitem, is_read):
         """Update the read mark in the engine and in the UI"""
-        self.feed.mark_feed_item_as(metaitem["channel"], metaitem["id"], is_read)
+        # queued, the click shouldn't wait for a refresh storing its items
+        self.writes.submit(
+            self.feed.mark_feed_item_as, metaitem["channel"], metaitem["id"], is_read
+        )
 
         if is_read:
             self._mark_list_item_read(item)
@@ -139,7 +194,7 @@ class Window(Qt.QMainWindow):
         item = list(it)[0]
         item["read"] = not item["read"]
 
-        self._set_content(item["content"])
+        self._set_content(self.feed.get_item_content(item["channel"], item["id"]))
         # FIXME: clicking is not responsive since the listwidgetitem style
         # does not consistently changes all times, whitch make it confusing
         self._set_item_status(qt_item, item, item["read"])
@@ -153,18 +208,36 @@ class Window(Qt.QMainWindow):
 
     def _mark_read_clicked(self):
         items = self.list_item.selectedItems()
+        metaitems = []
         for item in items:
             # not the ideal way but i can't get the indexes of all selected items
             it = filter(lambda it: it["title"] == item.text(), self.list_item_metadata)
-            metaitem = list(it)[0]
-            self._set_item_status(item, metaitem, True)
+            metaitems.append(list(it)[0])
+
+        if len(metaitems) == 0:
+            return
+
+        channel_id = metaitems[0]["channel"]
+        self.writes.submit(
+            self.feed.mark_feed_items_as,
+            channel_id,
+            [metaitem["id"] for metaitem in metaitems],
+            True,
+        )
+        for item, metaitem in zip(items, metaitems):
+            metaitem["read"] = True
+            self._mark_list_item_read(item)
 
     def _mark_all_read_clicked(self):
-        size = self.list_item.count()
-        for i in range(size):
-            item = self.list_item.item(i)
-            metaitem = self.list_item_metadata[i]
-            self._set_item_status(item, metaitem, True)
+        if len(self.list_item_metadata) == 0:
+            return
+
+        self.writes.submit(
+            self.feed.mark_channel_as, self.list_item_metadata[0]["channel"], True
+        )
+        for i, metaitem in enumerate(self.list_item_metadata):
+            metaitem["read"] = True
+            self._mark_list_item_read(self.list_item.item(i))
 
     def _refresh_clicked(self):
         # TODO: check the better way of
@@ -172,14 +245,38 @@ class Window(Qt.QMainWindow):
         # the current item, current channel and
         # everything
         self._show_notifications = True
+        # the dialog may have added a channel
+        self._scheduler_loaded = None
         self._load_channel()
         # text = fetch_rss('https://mundopodcast.com.br/feed/')
         # parse_rss(text, 'https://mundopodcast.com.br/feed/', url)
 
     def _look_for_updates(self):
-        urls = self.feed.channel_links
-        for url in urls:
-            parse_rss(self.feed, fetch_rss(url), url)
+        # off the gui thread, the new items are notified from the refresher's
+        # and sent to this one by new_item_added
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_due_channels, daemon=True
+        )
+        self._refresh_thread.start()
+
+    # seconds between looks for channels added elsewhere, the daemon for one
+    SCHEDULER_RELOAD = 10 * 60
+
+    def _refresh_due_channels(self):
+        # the scheduler is only used from this thread. Loading reads every
+        # channel, so it isn't done on each tick.
+        loaded = self._scheduler_loaded
+        if loaded is None or time.monotonic() - loaded > self.SCHEDULER_RELOAD:
+            self._scheduler_loaded = time.monotonic()
+            self.scheduler.load(self.feed)
+        report = self.scheduler.tick(self.refresher)
+        # by the policies stored with `python -m syndicate retention`, on this
+        # thread as well so the gui doesn't wait for it
+        if report.new_items and self.feed.retention_policies():
+            self.feed.prune()
 
     def _add_channel(self, text):
         # TODO: this snippet will be used to set up folders
@@ -193,11 +290,11 @@ class Window(Qt.QMainWindow):
 
     @QtCore.pyqtSlot(QtWidgets.QTreeWidgetItem, int)
     def _tree_item_selected(self, it, col):
-        title = it.text(col)
-        iterator = filter(lambda _tuple: _tuple[1] == title, self.channel_list_metadata)
-        items = list(iterator)
-        if len(items) != 0:
-            id = items[0][0]
+        # the text may have the unread count, the position is the same as in
+        # the metadata though
+        index = self.tree_view_channels.indexOfTopLevelItem(it)
+        if 0 <= index < len(self.channel_list_metadata):
+            id = self.channel_list_metadata[index][0]
             # do the stuff with it...
             self._load_feed(id)
 
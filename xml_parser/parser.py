@@ -1,11 +1,37 @@
 from __future__ import annotations
-from typing import TypeVar
-from bs4 import BeautifulSoup
+import codecs
+import re
+from typing import BinaryIO, Iterator, TypeVar, Union
+from lxml import etree
 
 T = TypeVar("T")
 
+# A document may be given as text, as its raw bytes (bytes, bytearray,
+# memoryview, mmap...) or as a binary file to be read
+Content = Union[str, bytes, BinaryIO]
+
+# A document arriving in pieces, like a download, which only the incremental
+# parsers (iterparse) take
+Chunks = Iterator[Union[str, bytes]]
+
+# Checked in this order since the utf-32 le bom starts with the utf-16 one
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+_XML_DECLARATION_ENCODING = re.compile(
+    rb"""<\?xml[^>]*?encoding\s*=\s*["']([A-Za-z][A-Za-z0-9._-]*)["']"""
+)
+
 
 class XmlParser:
+    # How many characters (or bytes) are fed to the incremental parsers at a time
+    CHUNK_SIZE = 64 * 1024
+
     class XmlDocument:
         """Wrapper around witchever xml parser we're using"""
 
@@ -47,7 +73,323 @@ class XmlParser:
 
             return nodes
 
+        def children(self) -> Iterator[tuple[str, XmlParser.XmlDocument]]:
+            """Yield (tag name, element) for each direct child element, in order.
+            Namespaced children are skipped when ignoring namespaces."""
+            from bs4 import Tag
+
+            for node in self._node.children:
+                if not isinstance(node, Tag):
+                    continue
+
+                if self._ignore_namespace and node.namespace:
+                    continue
+
+                yield (node.name, type(self)(node))
+
+    class LazyText:
+        """Text of an element kept as a span of the original document buffer
+        (a memoryview, so no copy is made) that is only decoded, and its
+        entities and CDATA sections resolved, once str() is called on it."""
+
+        __slots__ = ("_buffer", "_start", "_end", "_encoding", "_text")
+
+        def __init__(self, buffer, start: int, end: int, encoding: str = "utf-8"):
+            self._buffer = buffer
+            self._start = start
+            self._end = end
+            self._encoding = encoding
+            self._text = None
+
+        def __len__(self):
+            """Length of the raw span in bytes, not of the decoded text"""
+            return self._end - self._start
+
+        def __str__(self):
+            if self._text is None:
+                raw = bytes(self._buffer[self._start : self._end])
+                # the span's markup is parsed on its own to get the same text
+                # the whole document parse would, hence recover for prefixes
+                # declared outside of it
+                parser = etree.XMLParser(
+                    encoding=self._encoding, resolve_entities=False, recover=True
+                )
+                element = etree.fromstring(b"<text>" + raw + b"</text>", parser)
+                self._text = "".join(element.itertext())
+                self._buffer = None
+
+            return self._text
+
+        def __eq__(self, other):
+            if isinstance(other, (str, XmlParser.LazyText)):
+                return str(self) == str(other)
+
+            return NotImplemented
+
+        def __hash__(self):
+            return hash(str(self))
+
+        def __repr__(self):
+            if self._text is None:
+                return f"<LazyText bytes {self._start}:{self._end}>"
+
+            return repr(self._text)
+
+    class LxmlDocument(XmlDocument):
+        """XmlDocument over a lxml element, selectors are compiled to XPath"""
+
+        # (selector, ignore_namespace, first_only) -> compiled XPath
+        _xpaths = {}
+
+        @classmethod
+        def _compile(cls, selector, ignore_namespace, first_only):
+            key = (selector, ignore_namespace, first_only)
+            if xpath := cls._xpaths.get(key):
+                return xpath
+
+            # Only type selectors and the descendant combinator are supported,
+            # that is all the rss parser needs. Unprefixed names in XPath only
+            # match elements without a namespace, same as bs4's "|name".
+            tags = selector.lstrip("|").split()
+            if not ignore_namespace and not selector.startswith("|"):
+                tags = [f"*[local-name()='{tag}']" for tag in tags]
+
+            path = ".//" + "//".join(tags)
+            if first_only:
+                path = f"({path})[1]"
+
+            xpath = cls._xpaths[key] = etree.XPath(path)
+            return xpath
+
+        @property
+        def _element(self):
+            if isinstance(self._node, etree._ElementTree):
+                return self._node.getroot()
+
+            return self._node
+
+        @property
+        def text(self):
+            # same as bs4's .text, the text of the element and all its descendants
+            return "".join(self._element.itertext())
+
+        def get(self, attr: str, default: str = None):
+            return self._element.get(attr, default)
+
+        def select_one(self, selector: str) -> XmlParser.XmlDocument | None:
+            xpath = self._compile(selector, self._ignore_namespace, True)
+            if nodes := xpath(self._node):
+                return type(self)(nodes[0], self._ignore_namespace)
+
+            return None
+
+        def select_content(self, selector: str, cast_to: T = None) -> T | None:
+            if item := self.select_one(selector):
+                if cast_to:
+                    return cast_to(item.text)
+                return item.text
+
+            return None
+
+        def select(self, selector: str) -> list[XmlParser.XmlDocument]:
+            xpath = self._compile(selector, self._ignore_namespace, False)
+            nodes = xpath(self._node)
+            return [type(self)(node, self._ignore_namespace) for node in nodes]
+
+        def children(self) -> Iterator[tuple[str, XmlParser.XmlDocument]]:
+            nodes = self._node
+            if isinstance(nodes, etree._ElementTree):
+                nodes = [nodes.getroot()]
+
+            for node in nodes:
+                tag = node.tag
+                # comments and processing instructions
+                if not isinstance(tag, str):
+                    continue
+
+                if tag[0] == "{":
+                    if self._ignore_namespace:
+                        continue
+                    tag = tag[tag.index("}") + 1 :]
+
+                yield (tag, type(self)(node, self._ignore_namespace))
+
+    @staticmethod
+    def detect_encoding(head: bytes) -> str:
+        """Encoding of a document given its first bytes, from its byte order
+        mark or its xml declaration. Defaults to utf-8, as the xml spec says."""
+        head = bytes(head[:1024])
+        for bom, encoding in _BOMS:
+            if head.startswith(bom):
+                return encoding
+
+        # utf-16 without bom, "<?" as two byte characters
+        if head.startswith(b"<\x00?\x00"):
+            return "utf-16-le"
+        if head.startswith(b"\x00<\x00?"):
+            return "utf-16-be"
+
+        if match := _XML_DECLARATION_ENCODING.match(head):
+            return match.group(1).decode("ascii").lower()
+
+        return "utf-8"
+
+    @staticmethod
+    def is_file(content: Content):
+        # mmaps have read() too but are better used as buffers
+        return hasattr(content, "read") and not XmlParser._is_buffer(content)
+
+    @staticmethod
+    def _is_buffer(content: Content):
+        try:
+            memoryview(content)
+        except TypeError:
+            return False
+
+        return True
+
+    @staticmethod
+    def utf8_buffer(content: Content) -> memoryview:
+        """The document as a utf-8 encoded buffer. Buffers already in utf-8
+        (most of them) are not copied, files are read whole."""
+        if isinstance(content, str):
+            return memoryview(content.encode("utf-8"))
+
+        if XmlParser.is_file(content):
+            content = content.read()
+            if isinstance(content, str):
+                return memoryview(content.encode("utf-8"))
+
+        buffer = memoryview(content)
+        try:
+            encoding = codecs.lookup(XmlParser.detect_encoding(buffer)).name
+        except LookupError:
+            # nobody will be able to decode it anyway, let the parser complain
+            encoding = "utf-8"
+
+        if encoding == "utf-8":
+            if buffer[:3] == codecs.BOM_UTF8:
+                buffer = buffer[3:]
+            return buffer
+
+        text = bytes(buffer).decode(encoding, "replace").lstrip("\ufeff")
+        return memoryview(text.encode("utf-8"))
+
+    @staticmethod
+    def read_chunks(content: Content | Chunks) -> Iterator[str | bytes]:
+        """Split the document into pieces of about CHUNK_SIZE to be fed to an
+        incremental parser without ever copying it whole. Chunks already are
+        such pieces."""
+        size = XmlParser.CHUNK_SIZE
+        # files are iterators too, of lines though, so they are read first
+        if isinstance(content, str):
+            for start in range(0, len(content), size):
+                yield content[start : start + size]
+        elif XmlParser.is_file(content):
+            while chunk := content.read(size):
+                yield chunk
+        elif XmlParser._is_buffer(content):
+            buffer = memoryview(content)
+            for start in range(0, len(buffer), size):
+                yield bytes(buffer[start : start + size])
+        else:
+            yield from content
+
     @staticmethod
-    def parse(content: str) -> XmlParser.XmlDocument:
+    def _lxml_parser(encoding=None):
+        # Entities are not expanded so a feed can't make us read local files.
+        # The encoding of bytes is left for lxml to find out (bom or
+        # declaration) but str content is encoded to utf-8 before parsing,
+        # whatever its xml declaration says.
+        return etree.XMLParser(encoding=encoding, resolve_entities=False)
+
+    @staticmethod
+    def parse_lxml(content: Content) -> XmlParser.XmlDocument:
+        """Parse a well formed document, raises etree.XMLSyntaxError otherwise"""
+        if isinstance(content, str):
+            parser = XmlParser._lxml_parser("utf-8")
+            tree = etree.fromstring(content.encode("utf-8"), parser).getroottree()
+        elif XmlParser.is_file(content):
+            tree = etree.parse(content, XmlParser._lxml_parser())
+        else:
+            tree = etree.fromstring(content, XmlParser._lxml_parser()).getroottree()
+
+        # the root element is wrapped in its tree so selectors can match it too
+        return XmlParser.LxmlDocument(tree)
+
+    @staticmethod
+    def parse_soup(content: Content) -> XmlParser.XmlDocument:
+        """Slower but lenient parser for broken markup"""
+        # only imported when needed, it is slow to import and rarely used
+        from bs4 import BeautifulSoup
+
+        if not isinstance(content, (str, bytes)) and not XmlParser.is_file(content):
+            content = bytes(content)
+
         root = BeautifulSoup(content, features="lxml-xml")
         return XmlParser.XmlDocument(root)
+
+    # Backends by name, "auto" tries lxml first and falls back to bs4 when
+    # the document is not well formed
+    BACKENDS = ("auto", "lxml", "bs4")
+
+    @staticmethod
+    def parse(content: Content, backend: str = "auto") -> XmlParser.XmlDocument:
+        if backend == "bs4":
+            return XmlParser.parse_soup(content)
+
+        if backend == "lxml":
+            return XmlParser.parse_lxml(content)
+
+        if backend != "auto":
+            raise ValueError(
+                f"Unknown xml backend {backend}, expected one of {XmlParser.BACKENDS}"
+            )
+
+        position = None
+        if XmlParser.is_file(content):
+            # the file must be read again by bs4 if lxml fails
+            if content.seekable():
+                position = content.tell()
+            else:
+                content = content.read()
+
+        try:
+            return XmlParser.parse_lxml(content)
+        except etree.XMLSyntaxError:
+            if position is not None:
+                content.seek(position)
+            return XmlParser.parse_soup(content)
+
+    @staticmethod
+    def iterparse(
+        content: Content | Chunks, tag: str
+    ) -> Iterator[XmlParser.XmlDocument]:
+        """Incrementally parse the content yielding every element named `tag`
+        (without namespace) as soon as it is closed.
+
+        The element is freed after the consumer asks for the next one, so
+        whatever is needed from it must be read before that."""
+        parser = etree.XMLPullParser(events=("end",), tag=tag, recover=True)
+
+        def drain():
+            for _, element in parser.read_events():
+                yield XmlParser.LxmlDocument(element)
+
+                # Drop the element and everything that came before it so the
+                # tree never holds more than one of them at a time
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+        for chunk in XmlParser.read_chunks(content):
+            parser.feed(chunk)
+            yield from drain()
+
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            # truncated document, what was already parsed is all we've got
+            pass
+
+        yield from drain()
@@ -0,0 +1,64 @@
+import io
+import unittest
+from lxml import etree
+from xml_parser.parser import XmlParser
+
+
+class XmlParserTest(unittest.TestCase):
+    content = """
+        <rss xmlns:atom="http://www.w3.org/2005/Atom" version="2.0">
+            <channel>
+                <title>Channel <![CDATA[<b>Title</b>]]></title>
+                <atom:link href="http://test.t/feed/" rel="self"/>
+                <link>https://test.test</link>
+                <item><category domain="d">a</category></item>
+                <item><category>b</category></item>
+            </channel>
+        </rss>
+    """
+
+    def test_backends_select_the_same_content(self):
+        for backend in ("lxml", "bs4"):
+            with self.subTest(backend=backend):
+                root = XmlParser.parse(self.content, backend)
+                channel = root.select_one("channel")
+
+                title = channel.select_content("title")
+                self.assertEqual(title, "Channel <b>Title</b>")
+                self.assertEqual(channel.select_one("link").text, "https://test.test")
+                self.assertEqual(channel.select_content("ttl", cast_to=int), None)
+                categories = root.select("channel item category")
+                self.assertEqual(
+                    [(c.get("domain"), c.text) for c in categories],
+                    [("d", "a"), (None, "b")],
+                )
+
+    def test_auto_backend_prefers_lxml(self):
+        root = XmlParser.parse(self.content)
+        self.assertIsInstance(root, XmlParser.LxmlDocument)
+
+    def test_auto_backend_falls_back_to_bs4_for_broken_markup(self):
+        content = "<rss><channel><title>Title</channel></rss>"
+
+        with self.assertRaises(etree.XMLSyntaxError):
+            XmlParser.parse(content, "lxml")
+
+        root = XmlParser.parse(content)
+        self.assertNotIsInstance(root, XmlParser.LxmlDocument)
+        self.assertEqual(root.select_content("channel title"), "Title")
+
+    def test_iterparse_chunks(self):
+        content = self.content.encode("utf-8")
+        chunks = (content[start : start + 7] for start in range(0, len(content), 7))
+
+        categories = [
+            item.select_content("category")
+            for item in XmlParser.iterparse(chunks, "item")
+        ]
+        self.assertEqual(categories, ["a", "b"])
+
+    def test_read_chunks_of_a_file(self):
+        # a single line document, not read by line
+        content = io.BytesIO(b"<rss>" + b"a" * (XmlParser.CHUNK_SIZE * 2) + b"</rss>")
+        sizes = [len(chunk) for chunk in XmlParser.read_chunks(content)]
+        self.assertEqual(sizes, [XmlParser.CHUNK_SIZE, XmlParser.CHUNK_SIZE, 11])